@@ -3,7 +3,9 @@ from structlog.typing import FilteringBoundLogger
 from config.models import Config
 
 from bot.api.sms_client.sms_activate import SMSActivateAPI
+from bot.api.sms_client.webhook import SmsActivateWebhook
 from bot.api.payments.crypto_bot import CryptoBotAPI
+from bot.api.sharding import WorkerShard
 
 
 async def check_all_payments_system(logger: FilteringBoundLogger, config: Config, sms_activate: SMSActivateAPI, crypto_bot: CryptoBotAPI):
@@ -0,0 +1,181 @@
+import asyncio
+import time
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from structlog.typing import FilteringBoundLogger
+
+
+class AsyncTTLCache:
+    '''
+    Общий in-process кэш ответов API с TTL и stale-while-revalidate.
+
+    Пока запись свежая - отдаётся из памяти. После истечения ttl запись ещё
+    stale_ttl секунд отдаётся как есть, а в фоне запускается обновление.
+    Если запись устарела полностью (или её нет) - вызывающий ждёт загрузку.
+
+    Args:
+        - name: имя кэша для логов
+        - ttl: время жизни свежей записи (сек)
+        - stale_ttl: сколько ещё можно отдавать устаревшую запись (сек)
+        - maxsize: максимум ключей, при переполнении вытесняется самый давний (LRU)
+    '''
+
+    def __init__(
+            self,
+            name: str,
+            ttl: float,
+            stale_ttl: float,
+            logger: FilteringBoundLogger,
+            maxsize: Optional[int] = None
+        ) -> None:
+        self.name = name
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.maxsize = maxsize
+        self.logger = logger
+
+        self._entries: 'OrderedDict[Hashable, Tuple[Any, float]]' = OrderedDict()
+        self._refreshing: Dict[Hashable, asyncio.Task] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self.evictions = 0
+        self.stale_on_error = 0
+
+    def _store(self, key: Hashable, value: Any) -> None:
+        self._entries[key] = (value, time.monotonic())
+        self._entries.move_to_end(key)
+
+        if self.maxsize is not None:
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _age(self, key: Hashable) -> Optional[float]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return time.monotonic() - entry[1]
+
+    async def get_or_load(
+            self,
+            key: Hashable,
+            loader: Callable[[], Awaitable[Any]]
+        ) -> Any:
+        '''
+        Возвращает значение по ключу, при необходимости загружая его через loader.
+        Пустые ответы (ошибки API) в кэш не попадают.
+        '''
+        age = self._age(key)
+
+        if age is not None and age < self.ttl:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+        if age is not None and age < self.ttl + self.stale_ttl:
+            self.stale_hits += 1
+            self._entries.move_to_end(key)
+            self._schedule_refresh(key, loader)
+            return self._entries[key][0]
+
+        self.misses += 1
+        try:
+            value = await loader()
+        except Exception:
+            # Провайдер недоступен (в т.ч. открыт circuit breaker) -
+            # лучше отдать устаревшие данные, чем ошибку
+            if key not in self._entries:
+                raise
+            self.stale_on_error += 1
+            return self._entries[key][0]
+
+        if value:
+            self._store(key, value)
+        elif key in self._entries:
+            # Пустой ответ - ошибка API (например 5xx после повторов), а не пустые данные
+            self.stale_on_error += 1
+            return self._entries[key][0]
+        return value
+
+    def _schedule_refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._refreshing:
+            return
+        self._refreshing[key] = asyncio.create_task(self._refresh(key, loader))
+
+    async def _refresh(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> None:
+        try:
+            value = await loader()
+            if value:
+                self._store(key, value)
+                self.refreshes += 1
+            else:
+                self.refresh_errors += 1
+        except Exception as e:
+            self.refresh_errors += 1
+            self.logger.warning(
+                f"Ошибка фонового обновления кэша - {self.name}",
+                key=str(key),
+                error=str(e)
+            )
+        finally:
+            self._refreshing.pop(key, None)
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'stale_hits': self.stale_hits,
+            'misses': self.misses,
+            'refreshes': self.refreshes,
+            'refresh_errors': self.refresh_errors,
+            'evictions': self.evictions,
+            'stale_on_error': self.stale_on_error
+        }
+
+
+class SingleFlight:
+    '''
+    Объединение одинаковых одновременных запросов (single-flight).
+
+    Пока запрос с ключом key выполняется, остальные вызовы do(key, ...)
+    не создают новый запрос, а ждут результат (или исключение) первого.
+    '''
+
+    def __init__(self) -> None:
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+
+        if task is None:
+            self.calls += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+
+        # shield: отмена одного ожидающего не отменяет запрос для остальных
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'in_flight': len(self._calls),
+            'calls': self.calls,
+            'shared': self.shared
+        }
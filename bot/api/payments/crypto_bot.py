@@ -1,12 +1,15 @@
 import asyncio
-from typing import List, Dict, Union
+from typing import List, Dict, Optional, Union
 
 from aiogram import Bot
-from httpx import AsyncClient
+from httpx import Response
 from structlog.typing import FilteringBoundLogger
 
 from . import CalculatorAsset
-from bot.database import InvoicesDatabase, GlobalDatabase, ReferalDatabase
+from bot.api.ratelimit import RequestGate
+from bot.api.sharding import WorkerShard
+from bot.api.transport import build_client
+from bot.database import db, InvoicesDatabase, GlobalDatabase, ReferalDatabase, OutboxDatabase, run_db
 from config.models import Config
 
 
@@ -16,7 +19,8 @@ class CryptoBotAPI:
             bot: Bot, 
             config: Config, 
             logger: FilteringBoundLogger, 
-            backend_puller_autostart: bool = True
+            backend_puller_autostart: bool = True,
+            shard: Optional[WorkerShard] = None
         ) -> None:
         self.bot = bot
         self.logger = logger
@@ -25,14 +29,26 @@ class CryptoBotAPI:
         self.token = config.crypto_bot_api_token
         self.payment_rate = config.cryptobot_usdt_rub_rate
 
-        self.client = AsyncClient(
-            base_url='https://pay.crypt.bot/api/',
-            headers={
+        client_kwargs = {
+            'base_url': 'https://pay.crypt.bot/api/',
+            'headers': {
                 'Crypto-Pay-API-Token': self.token
-        })
+            }
+        }
+        self.client = build_client(config, **client_kwargs)
+        # Отдельный пул для backend puller
+        self.background_client = build_client(config, background=True, **client_kwargs)
         
         self.global_name = 'CryptoBot'
         self._running = False
+        # Несколько процессов бота: проверяем только свою долю счетов
+        self.shard = shard
+
+        # Отдельные бюджеты запросов для пользователей и backend puller,
+        # одинаковые одновременные запросы на чтение идут одним запросом
+        self.requests = RequestGate(
+            self.global_name, config.crypto_bot_rps, config.crypto_bot_background_rps, logger
+        )
 
         if backend_puller_autostart:
             self._running = True
@@ -49,8 +65,28 @@ class CryptoBotAPI:
 
         return result_string if result_string != '' else 0.0
     
+    async def _request(
+            self, 
+            api_method: str, 
+            params: Union[Dict, None] = None, 
+            coalesce: bool = False, 
+            background: bool = False
+        ) -> Response:
+        '''
+        Запрос к Crypto Pay API, coalesce - см. RequestGate.request.
+        background=True - запрос идёт через отдельный пул backend puller.
+        '''
+        return await self.requests.request(
+            api_method, params, lambda: self._send(api_method, params, background), coalesce
+        )
+
+    async def _send(self, api_method: str, params: Union[Dict, None] = None, background: bool = False) -> Response:
+        client = self.background_client if background else self.client
+        await self.requests.wait(background, api_method=api_method)
+        return await client.get(api_method, params=params)
+
     async def get_balance(self, isinit: bool = False) -> Union[str, bool]:
-        response = await self.client.get('getBalance')
+        response = await self._request('getBalance', coalesce=True)
         response_json = response.json()
 
         if response_json.get("ok", False) == False:
@@ -69,7 +105,7 @@ class CryptoBotAPI:
             amount: int, 
             description: str = "Пополнение баланса бота"
         ) -> Union[Dict[str, Union[str, int]], None]:
-        payment_result = await self.client.get(
+        payment_result = await self._request(
             'createInvoice', params={
                 "asset": asset,
                 "amount": amount,
@@ -85,7 +121,7 @@ class CryptoBotAPI:
         
     
     async def wait_for_database(self):
-        while not GlobalDatabase.tables_is_created():
+        while not await run_db(GlobalDatabase.tables_is_created):
             await asyncio.sleep(0.1)
 
     async def __process_invoice_backend(self, invoice: Dict[str, str]):
@@ -93,22 +129,39 @@ class CryptoBotAPI:
             amount_converted = CalculatorAsset.convert_to_fiat(
                 float(invoice['amount']), self.payment_rate
             )
-            user_id, message_id = InvoicesDatabase.success_invoice(str(invoice['invoice_id']), amount_converted)
-            ref_owner = ReferalDatabase.get_referal_owner(user_id)
-            if ref_owner:
-                ReferalDatabase.process_referal_payment(ref_owner, amount_converted, self.bot.config.referal_fee)
-
-            await self.bot.send_message(
-                user_id, text=self.bot.textgen.get(
-                    'common', 'success_pay', 'text', amount=amount_converted
-                ), reply_markup=self.bot.textgen.generate_keyboard_markup(
-                    'action', 'start', 'buttons'
-                ), message_effect_id=self.bot.config.success_payment_reaction_id
+            text = self.bot.textgen.get(
+                'common', 'success_pay', 'text', amount=amount_converted
             )
-            try:
-                await self.bot.delete_message(user_id, message_id)
-            except:
-                pass
+
+            def success_payment():
+                with db.atomic():
+                    paid_invoice = InvoicesDatabase.success_invoice(str(invoice['invoice_id']), amount_converted)
+                    if not paid_invoice:
+                        return None
+
+                    user_id, _ = paid_invoice
+                    ref_owner = ReferalDatabase.get_referal_owner(user_id)
+                    if ref_owner:
+                        ReferalDatabase.process_referal_payment(ref_owner, amount_converted, self.bot.config.referal_fee)
+
+                    OutboxDatabase.add(
+                        user_id,
+                        text,
+                        priority='high',
+                        keyboard=['action', 'start', 'buttons'],
+                        message_effect_id=self.bot.config.success_payment_reaction_id
+                    )
+                    return paid_invoice
+
+            paid_invoice = await run_db(success_payment)
+            if not paid_invoice:
+                return
+
+            user_id, message_id = paid_invoice
+            self.bot.outbox.notify()
+
+            # Ошибка удаления не важна - результат не ждём
+            self.bot.send_queue.enqueue('delete_message', user_id, 'low', message_id=message_id)
     
     async def _backend_puller(self):
         '''
@@ -116,21 +169,38 @@ class CryptoBotAPI:
         '''
 
         await self.wait_for_database()
-        while self._running:
-            invoices_id_list = InvoicesDatabase.get_actual_invoices_id(
-                self.payment_timeout, 'crypto_bot'
-            )
+        if self.shard:
+            await self.shard.wait_ready()
 
-            if invoices_id_list:
-                invoices_response = await self.client.get('getInvoices', params={
-                    "invoice_ids": ",".join(invoices_id_list)
-                })
-                for invoice in invoices_response.json()['result']['items']:
-                    await self.__process_invoice_backend(invoice)
+        while self._running:
+            # Ошибка одного цикла не должна останавливать puller: аренда
+            # воркера продлевается, и его доля счетов иначе не проверяется никем
+            try:
+                await self._poll_invoices()
+            except Exception as e:
+                self.logger.error(
+                    f"❌ Ошибка в backend puller - {self.global_name}",
+                    error=str(e)
+                )
 
             await asyncio.sleep(self.timeout_cryptobot_updates)
 
+    async def _poll_invoices(self):
+        invoices_id_list = [
+            invoice_id
+            for invoice_id in await run_db(InvoicesDatabase.get_actual_invoices_id, self.payment_timeout, 'crypto_bot')
+            if self.shard is None or self.shard.owns(('invoice', str(invoice_id)))
+        ]
+
+        if invoices_id_list:
+            invoices_response = await self._request('getInvoices', params={
+                "invoice_ids": ",".join(invoices_id_list)
+            }, background=True)
+            for invoice in invoices_response.json()['result']['items']:
+                await self.__process_invoice_backend(invoice)
+
     
     async def close(self):
         self._running = False
-        await self.client.aclose()
\ No newline at end of file
+        await self.client.aclose()
+        await self.background_client.aclose()
\ No newline at end of file
@@ -0,0 +1,107 @@
+import asyncio
+import time
+
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from structlog.typing import FilteringBoundLogger
+
+from bot.api.cache import SingleFlight
+
+
+class TokenBucket:
+    '''
+    Асинхронный token bucket: rate токенов в секунду, запас до capacity.
+
+    acquire() ждёт свободный токен (в порядке очереди) и возвращает
+    время ожидания - задержку, которую добавил лимитер. rate <= 0 - без лимита.
+    '''
+
+    def __init__(self, name: str, rate: float, capacity: Union[float, None] = None) -> None:
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+        self.acquired = 0
+        self.delayed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+
+        started_at = time.monotonic()
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+        waited = time.monotonic() - started_at
+        self.acquired += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        if waited > 0.001:
+            self.delayed += 1
+        return waited
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        return {
+            'acquired': self.acquired,
+            'delayed': self.delayed,
+            'avg_wait': round(self.total_wait / self.acquired, 4) if self.acquired else 0.0,
+            'max_wait': round(self.max_wait, 4)
+        }
+
+
+class RequestGate:
+    '''
+    Общая обвязка запросов клиентов API (SMS-Activate, CryptoBot):
+    раздельные TokenBucket для пользователей и backend puller и
+    объединение одинаковых одновременных запросов (SingleFlight).
+
+    request() - вход запроса (coalesce), wait() - ожидание лимита
+    непосредственно перед отправкой в сеть.
+    '''
+
+    def __init__(self, name: str, rps: float, background_rps: float, logger: FilteringBoundLogger) -> None:
+        self.logger = logger
+        self.rate_limiter = TokenBucket(name, rps)
+        self.background_rate_limiter = TokenBucket(f'{name}:background', background_rps)
+        self.single_flight = SingleFlight()
+
+    async def request(
+            self,
+            name: str,
+            params: Optional[Dict],
+            send: Callable[[], Awaitable[Any]],
+            coalesce: bool = False
+        ) -> Any:
+        '''
+        С coalesce=True одинаковые одновременные запросы (name + параметры)
+        делят один вызов send() и его результат.
+        '''
+        if coalesce:
+            key = (name, tuple(sorted((param, str(value)) for param, value in (params or {}).items())))
+            return await self.single_flight.do(key, send)
+        return await send()
+
+    async def wait(self, background: bool = False, **log_fields: Any) -> float:
+        rate_limiter = self.background_rate_limiter if background else self.rate_limiter
+        waited = await rate_limiter.acquire()
+        if waited > 1:
+            self.logger.debug(
+                f"Очередь лимита запросов - {rate_limiter.name}",
+                waited=round(waited, 3),
+                **log_fields
+            )
+        return waited
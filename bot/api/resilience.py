@@ -0,0 +1,98 @@
+import random
+import time
+
+from typing import Dict, Union
+
+from structlog.typing import FilteringBoundLogger
+
+
+class CircuitOpenError(Exception):
+    '''Запрос не отправлен: circuit breaker открыт'''
+
+
+class CircuitBreaker:
+    '''
+    Circuit breaker для внешнего API.
+
+    closed    - запросы идут как обычно, считаем подряд идущие ошибки
+    open      - после failure_threshold ошибок подряд запросы сразу падают
+                с CircuitOpenError в течение reset_timeout секунд
+    half_open - после reset_timeout пропускаем один пробный запрос:
+                успех закрывает breaker, ошибка снова открывает
+    '''
+
+    def __init__(
+            self,
+            name: str,
+            failure_threshold: int,
+            reset_timeout: float,
+            logger: FilteringBoundLogger
+        ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.logger = logger
+
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == 'closed':
+            return True
+
+        if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state('half_open')
+
+        if self.state == 'half_open' and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+
+        self.rejected += 1
+        return False
+
+    def check(self) -> None:
+        if not self.allow():
+            raise CircuitOpenError(f'{self.name}: circuit breaker is open')
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._probe_in_flight = False
+        if self.state != 'closed':
+            self._set_state('closed')
+
+    def release(self) -> None:
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+            self.opened_at = time.monotonic()
+            self.opened_count += 1
+            self._set_state('open')
+
+    def _set_state(self, state: str) -> None:
+        self.logger.warning(
+            f"Circuit breaker - {self.name}",
+            old_state=self.state,
+            new_state=state,
+            failures=self.failures
+        )
+        self.state = state
+
+    def stats(self) -> Dict[str, Union[str, int]]:
+        return {
+            'state': self.state,
+            'failures': self.failures,
+            'opened_count': self.opened_count,
+            'rejected': self.rejected
+        }
+
+
+def backoff_delay(attempt: int, base: float, cap: float = 10.0) -> float:
+    '''Экспоненциальная задержка с full jitter: random(0, min(cap, base * 2^attempt))'''
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,92 @@
+import asyncio
+import os
+import socket
+import time
+import zlib
+
+from typing import Dict, Hashable, List, Optional, Union
+
+from structlog.typing import FilteringBoundLogger
+
+from bot.database import LeaseDatabase, run_db
+from config.models import Config
+
+
+class WorkerShard:
+    '''
+    Распределение заказов между процессами бота через таблицу worker_leases.
+
+    Каждый процесс раз в heartbeat_interval секунд продлевает свою аренду
+    и перечитывает список живых воркеров (heartbeat не старше lease_ttl).
+    Владелец заказа выбирается rendezvous hashing: при падении воркера
+    к другим переходят только его заказы, остальные остаются на месте.
+
+    Пока список воркеров у процессов расходится (до lease_ttl после падения
+    или запуска), заказ могут опросить двое - зачисления и смены статусов
+    защищены условными UPDATE в bot.database.
+    '''
+
+    def __init__(self, config: Config, logger: FilteringBoundLogger) -> None:
+        self.worker_id = config.worker_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.heartbeat_interval = config.worker_heartbeat_interval
+        self.lease_ttl = config.worker_lease_ttl
+        self.logger = logger
+
+        self.workers: List[str] = []
+        self._last_heartbeat = 0.0
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        await self._heartbeat()
+        self._task = asyncio.create_task(self._heartbeat_loop())
+
+        self.logger.info(f'✅ WORKER: {self.worker_id}, live workers: {len(self.workers)}')
+
+    async def wait_ready(self) -> None:
+        await self._ready.wait()
+
+    def owns(self, key: Hashable) -> bool:
+        '''Опрашивает ли этот процесс заказ с ключом key'''
+        # Без продления аренды остальные воркеры уже забрали наши заказы
+        if time.monotonic() - self._last_heartbeat > self.lease_ttl:
+            return False
+        if len(self.workers) <= 1:
+            return True
+
+        return max(self.workers, key=lambda worker_id: zlib.crc32(f'{worker_id}|{key}'.encode())) == self.worker_id
+
+    def _renew_lease(self) -> List[str]:
+        LeaseDatabase.heartbeat(self.worker_id)
+        return LeaseDatabase.get_live_workers(self.lease_ttl)
+
+    async def _heartbeat(self) -> None:
+        workers = await run_db(self._renew_lease)
+        if workers != self.workers:
+            self.logger.info(f'Rebalance workers - {self.worker_id}', workers=workers)
+        self.workers = workers
+        self._last_heartbeat = time.monotonic()
+        self._ready.set()
+
+    async def _heartbeat_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self._heartbeat()
+                await run_db(LeaseDatabase.delete_expired, self.lease_ttl)
+            except Exception as e:
+                self.logger.error(
+                    f"❌ Error heartbeat - {self.worker_id}",
+                    error=str(e)
+                )
+
+    def stats(self) -> Dict[str, Union[str, int]]:
+        return {
+            'worker_id': self.worker_id,
+            'workers': len(self.workers)
+        }
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+        await run_db(LeaseDatabase.release, self.worker_id)
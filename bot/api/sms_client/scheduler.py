@@ -0,0 +1,61 @@
+import heapq
+
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+
+class PollScheduler:
+    '''
+    Расписание опроса заказов: min-heap по времени следующей проверки.
+
+    Ключи - произвольные hashable (например ('sms', id) или ('rent', id)).
+    Перепланирование не удаляет старую запись из кучи, а помечает её
+    устаревшей через self._next - такие записи пропускаются при pop_due.
+
+    pop_due снимает ключи с расписания: вызывающий код планирует их
+    заново через schedule, а если не успел (ошибка в цикле) - следующий
+    sync вернёт их как новые, и заказ не потеряется.
+    '''
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, Hashable]] = []
+        self._next: Dict[Hashable, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._next)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._next
+
+    def sync(self, keys: Iterable[Hashable], now: float) -> None:
+        '''
+        Приводит расписание к актуальному списку ключей:
+        новые ключи проверяются сразу, пропавшие - удаляются.
+        '''
+        keys = set(keys)
+        for key in keys - self._next.keys():
+            self.schedule(key, now)
+        for key in self._next.keys() - keys:
+            del self._next[key]
+
+        # Не даём куче разрастаться из-за устаревших записей
+        if len(self._heap) > 4 * len(self._next) + 64:
+            self._heap = [(at, key) for key, at in self._next.items()]
+            heapq.heapify(self._heap)
+
+    def schedule(self, key: Hashable, at: float) -> None:
+        self._next[key] = at
+        heapq.heappush(self._heap, (at, key))
+
+    def pop_due(self, now: float) -> List[Hashable]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            at, key = heapq.heappop(self._heap)
+            if self._next.get(key) == at:
+                del self._next[key]
+                due.append(key)
+        return due
+
+    def next_due(self) -> Optional[float]:
+        while self._heap and self._next.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
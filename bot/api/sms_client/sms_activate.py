@@ -1,37 +1,128 @@
 from structlog.typing import FilteringBoundLogger
 from typing import Union, Dict, Optional
 
-from httpx import AsyncClient 
+from httpx import Response, TransportError
 from typing import Union
 
 import asyncio
+import time
 
-from bot.database import SmsOrdersDatabase, GlobalDatabase, UserDatabase, RentDatabase
+from datetime import datetime
+
+from bot.api.cache import AsyncTTLCache
+from bot.api.ratelimit import RequestGate
+from bot.api.resilience import CircuitBreaker, CircuitOpenError, backoff_delay
+from bot.api.transport import build_client
+from bot.api.sharding import WorkerShard
+from bot.api.sms_client.scheduler import PollScheduler
+from bot.database import db, SmsOrdersDatabase, GlobalDatabase, UserDatabase, RentDatabase, OutboxDatabase, run_db
+from config.models import Config
 from aiogram import Bot
 
 
 class SMSActivateAPI:
-    def __init__(self, sms_activate_token: str, logger: FilteringBoundLogger, bot: Bot) -> None:
+    # Только эти действия безопасно повторять при ошибке
+    IDEMPOTENT_ACTIONS = {
+        'getBalance', 'getServicesList', 'getTopCountriesByService', 'getPrices',
+        'getStatus', 'getRentStatus', 'getActiveActivations', 'getRentServicesAndCountries'
+    }
+
+    def __init__(
+            self,
+            sms_activate_token: str,
+            logger: FilteringBoundLogger,
+            bot: Bot,
+            config: Config,
+            shard: Optional[WorkerShard] = None
+        ) -> None:
         self.global_name = 'SmsActivate'
         self.api_key = sms_activate_token
         self.bot = bot
-        self.client = AsyncClient(
-            base_url='https://api.sms-activate.guru/',
-            params={
+        client_kwargs = {
+            'base_url': config.sms_activate_base_url,
+            'params': {
                 'api_key': self.api_key
-        })
+            }
+        }
+        self.client = build_client(config, **client_kwargs)
+        # Отдельный пул для backend puller
+        self.background_client = build_client(config, background=True, **client_kwargs)
         
         self.logger = logger
         self._running = True
+
+        self.timeout = config.sms_activate_timeout
+        self.action_timeouts = config.sms_activate_action_timeouts
+        self.retries = config.sms_activate_retries
+        self.retry_backoff = config.sms_activate_retry_backoff
+        # Отдельные бюджеты запросов для пользователей и backend puller,
+        # одинаковые одновременные запросы каталога/цен/баланса идут одним запросом
+        self.requests = RequestGate(
+            self.global_name, config.sms_activate_rps, config.sms_activate_background_rps, logger
+        )
+        self.breaker = CircuitBreaker(
+            self.global_name,
+            failure_threshold=config.sms_activate_breaker_threshold,
+            reset_timeout=config.sms_activate_breaker_reset,
+            logger=logger
+        )
+
+        self.poll_min_interval = config.sms_poll_min_interval
+        self.poll_max_interval = config.sms_poll_max_interval
+        self.rent_poll_max_interval = config.rent_poll_max_interval
+        if config.sms_webhook_enabled:
+            # SMS приходят через webhook, опрос остаётся медленной сверкой
+            self.poll_min_interval = self.poll_max_interval = config.sms_webhook_reconcile_interval
+            self.rent_poll_max_interval = max(self.rent_poll_max_interval, config.sms_webhook_reconcile_interval)
+        self.poll_scheduler = PollScheduler()
+        # Несколько процессов бота: опрашиваем только свою долю заказов
+        self.shard = shard
+        self._rent_quantity: Dict[int, int] = {}
+        self._rent_idle_polls: Dict[int, int] = {}
+        self.poll_concurrency = config.sms_poll_concurrency
+        self.bulk_status_sync = config.sms_bulk_status_sync
+        self.poll_stats = {
+            'cycles': 0,
+            'orders': 0,
+            'rents': 0,
+            'due': 0,
+            'fallback_requests': 0,
+            'last_cycle_duration': 0.0,
+            'max_cycle_duration': 0.0
+        }
+
+        # Общий кэш каталога сервисов (getServicesList)
+        self.services_cache = AsyncTTLCache(
+            'services',
+            ttl=config.services_cache_ttl,
+            stale_ttl=config.services_cache_stale_ttl,
+            logger=logger
+        )
+        # Страны и цены по коду сервиса (getTopCountriesByService), LRU
+        self.countries_cache = AsyncTTLCache(
+            'countries',
+            ttl=config.countries_cache_ttl,
+            stale_ttl=config.countries_cache_stale_ttl,
+            logger=logger,
+            maxsize=config.countries_cache_size
+        )
+        
+        # Индекс цен {country_id: {service: cost}} из полного getPrices
+        self.price_index: Dict[int, Dict[str, float]] = {}
+        self.price_index_updated_at = 0.0
+        self.price_index_interval = config.price_index_interval
         
         # Запускаем backend puller
         asyncio.create_task(self._backend_puller())
+        if self.price_index_interval > 0:
+            asyncio.create_task(self._price_index_puller())
     
     async def get_balance(self, isinit: bool = False) -> Union[str, bool]:
-        response = await self.client.get(
-            'stubs/handler_api.php', params={
+        response = await self._request(
+            params={
                 'action': 'getBalance'
-            }
+            },
+            coalesce=True
         )
         response_text = response.text
         if 'ACCESS_BALANCE' not in response_text:
@@ -45,18 +136,23 @@ class SMSActivateAPI:
             return float(response_text.split(':')[1])
     
     async def get_top_countries_by_service(self, service: str | None = None) -> Dict:
-        """Получение списка всех стран с ценами"""
-        response = await self.client.get(
-            'stubs/handler_api.php', 
+        """Получение списка всех стран с ценами (через кэш по коду сервиса)"""
+        service = service if service else ''
+        return await self.countries_cache.get_or_load(
+            service, lambda: self._fetch_top_countries_by_service(service)
+        )
+
+    async def _fetch_top_countries_by_service(self, service: str) -> Dict:
+        response = await self._request(
             params={
                 'action': 'getTopCountriesByService',
-                'service': service if service else ''
-            }
+                'service': service
+            },
+            coalesce=True
         )
         
         if response.status_code == 200:
-            self.countries_data = response.json()
-            return self.countries_data
+            return response.json()
         
         self.logger.error(
             f"❌ Ошибка получения списка стран - {self.global_name}",
@@ -66,15 +162,22 @@ class SMSActivateAPI:
 
     async def rent_number(self, service: str, rent_time: int, country: int = 0) -> Union[dict, bool]:
         """Получение номера в аренду для указанного сервиса"""
-        response = await self.client.get(
-            'stubs/handler_api.php',
-            params={
-                'action': 'getRentNumber',
-                'service': service,
-                'rent_time': rent_time,
-                'country': country
-            }
-        )
+        try:
+            response = await self._request(
+                params={
+                    'action': 'getRentNumber',
+                    'service': service,
+                    'rent_time': rent_time,
+                    'country': country
+                }
+            )
+        except (CircuitOpenError, TransportError) as e:
+            self.logger.error(
+                f"❌ Ошибка аренды номера - {self.global_name}",
+                error=repr(e),
+                service=service
+            )
+            return False
 
         if response.status_code != 200:
             self.logger.error(
@@ -89,15 +192,23 @@ class SMSActivateAPI:
             return response_data['phone']
         return False
     
-    async def get_rent_status(self, order_id: str) -> Union[Dict, bool]:
+    async def get_rent_status(self, order_id: str, background: bool = False) -> Union[Dict, bool]:
         """Получение статуса аренды и SMS"""
-        response = await self.client.get(
-            'stubs/handler_api.php',
-            params={
-                'action': 'getRentStatus',
-                'id': order_id
-            }
-        )
+        try:
+            response = await self._request(
+                params={
+                    'action': 'getRentStatus',
+                    'id': order_id
+                },
+                background=background
+            )
+        except (CircuitOpenError, TransportError) as e:
+            self.logger.error(
+                f"❌ Ошибка получения статуса аренды - {self.global_name}",
+                error=repr(e),
+                order_id=order_id
+            )
+            return False
         
         if response.status_code != 200:
             self.logger.error(
@@ -110,13 +221,17 @@ class SMSActivateAPI:
         return response.json()
 
     async def get_all_services(self) -> Dict:
+        """Получение каталога сервисов (через кэш)"""
+        return await self.services_cache.get_or_load('ru', self._fetch_all_services)
+
+    async def _fetch_all_services(self) -> Dict:
         """Получение доступных сервисов для конкретной страны"""
-        response = await self.client.get(
-            'stubs/handler_api.php',
+        response = await self._request(
             params={
                 'action': 'getServicesList',
                 'lang': 'ru'
-            }
+            },
+            coalesce=True
         )
         
         if response.status_code == 200:
@@ -130,14 +245,21 @@ class SMSActivateAPI:
 
     async def get_number(self, service: str, country: int = 0) -> Union[dict, bool]:
         """Получение номера для указанного сервиса"""
-        response = await self.client.get(
-            'stubs/handler_api.php', 
-            params={
-                'action': 'getNumber',
-                'service': service,
-                'country': country
-            }
-        )
+        try:
+            response = await self._request(
+                params={
+                    'action': 'getNumber',
+                    'service': service,
+                    'country': country
+                }
+            )
+        except (CircuitOpenError, TransportError) as e:
+            self.logger.error(
+                f"❌ Ошибка получения номера - {self.global_name}",
+                error=repr(e),
+                service=service
+            )
+            return False
         
         if response.status_code != 200:
             self.logger.error(
@@ -157,30 +279,112 @@ class SMSActivateAPI:
             }
         return False
 
-    async def get_status(self, activation_id: str) -> Union[str, bool]:
+    async def get_status(self, activation_id: str, background: bool = False) -> Union[str, bool]:
         """Получение статуса активации"""
-        response = await self.client.get(
-            'stubs/handler_api.php',
+        response = await self._request(
             params={
                 'action': 'getStatus',
                 'id': activation_id
-            }
+            },
+            background=background
         )
         
         if response.status_code == 200:
             return response.text
         return False
     
-    async def get_price(self, service: str, country_id: int):
-        response = await self.client.get(
-            'stubs/handler_api.php',
+    async def get_active_activations(self, background: bool = False) -> Union[Dict[str, Dict], bool]:
+        """Получение всех активных активаций одним запросом: {activationId: activation}"""
+        response = await self._request(
             params={
-                'action':'getPrices',
-                'service': service,
-                'country': country_id
-            }
+                'action': 'getActiveActivations'
+            },
+            coalesce=True,
+            background=background
         )
-        return response.json()[str(country_id)][str(service)]["cost"]
+
+        if response.status_code != 200:
+            return False
+
+        try:
+            response_data = response.json()
+        except ValueError:
+            # NO_ACTIVATIONS / BAD_KEY и прочие текстовые ответы
+            return {} if 'NO_ACTIVATION' in response.text else False
+
+        if response_data.get('status') != 'success':
+            return {} if 'NO_ACTIVATION' in str(response_data) else False
+
+        return {
+            str(activation['activationId']): activation
+            for activation in response_data.get('activeActivations', [])
+        }
+    
+    async def get_price(self, service: str, country_id: int) -> Optional[float]:
+        """Цена из индекса цен, при промахе - запрос к API, None если API недоступен"""
+        cached_price = self.get_cached_price(service, country_id)
+        if cached_price is not None:
+            return cached_price
+
+        try:
+            response = await self._request(
+                params={
+                    'action':'getPrices',
+                    'service': service,
+                    'country': country_id
+                },
+                coalesce=True
+            )
+            return response.json()[str(country_id)][str(service)]["cost"]
+        except (CircuitOpenError, TransportError, ValueError, KeyError) as e:
+            self.logger.error(
+                f"❌ Ошибка получения цены - {self.global_name}",
+                error=repr(e),
+                service=service,
+                country_id=country_id
+            )
+            return None
+
+    def get_cached_price(self, service: str, country_id: int) -> Optional[float]:
+        """O(1) поиск цены по (service, country) в индексе цен, None если нет"""
+        return self.price_index.get(int(country_id), {}).get(str(service))
+
+    async def refresh_price_index(self) -> None:
+        """Перестроение индекса цен из одного полного getPrices"""
+        response = await self._request(
+            params={
+                'action': 'getPrices'
+            },
+            coalesce=True,
+            background=True
+        )
+
+        if response.status_code != 200:
+            self.logger.error(
+                f"❌ Ошибка получения таблицы цен - {self.global_name}",
+                status_code=response.status_code
+            )
+            return
+
+        self.price_index = {
+            int(country_id): {
+                service: float(service_data['cost'])
+                for service, service_data in services.items()
+            }
+            for country_id, services in response.json().items()
+        }
+        self.price_index_updated_at = time.monotonic()
+
+    async def _price_index_puller(self):
+        while self._running:
+            try:
+                await self.refresh_price_index()
+            except Exception as e:
+                self.logger.error(
+                    "Ошибка обновления индекса цен",
+                    error=str(e)
+                )
+            await asyncio.sleep(self.price_index_interval)
 
     async def set_status(self, activation_id: str, status: int) -> bool:
         """Установка статуса активации
@@ -188,148 +392,405 @@ class SMSActivateAPI:
               6 - запросить еще одну смс
               3 - отменить активацию
         """
-        response = await self.client.get(
-            'stubs/handler_api.php',
-            params={
-                'action': 'setStatus',
-                'id': activation_id,
-                'status': status
-            }
-        )
+        try:
+            response = await self._request(
+                params={
+                    'action': 'setStatus',
+                    'id': activation_id,
+                    'status': status
+                }
+            )
+        except (CircuitOpenError, TransportError) as e:
+            self.logger.error(
+                f"❌ Ошибка смены статуса активации - {self.global_name}",
+                error=repr(e),
+                activation_id=activation_id,
+                status=status
+            )
+            return False
         
         return response.status_code == 200
     
+    async def set_rent_status(self, rent_id: str, status: int) -> bool:
+        """Установка статуса аренды
+        status: 1 - завершить аренду
+              2 - отменить аренду (возврат средств у провайдера)
+        """
+        try:
+            response = await self._request(
+                params={
+                    'action': 'setRentStatus',
+                    'id': rent_id,
+                    'status': status
+                }
+            )
+        except (CircuitOpenError, TransportError) as e:
+            self.logger.error(
+                f"❌ Ошибка смены статуса аренды - {self.global_name}",
+                error=repr(e),
+                rent_id=rent_id,
+                status=status
+            )
+            return False
+        
+        return response.status_code == 200
+
     async def get_rent_price(self, service: str, country_id: int, hours: int = 1) -> float:
-        response = await self.client.post(
-            'stubs/handler_api.php',
+        response = await self._request(
+            method='POST',
             params={
                 'action': 'getRentServicesAndCountries',
                 'rent_time': hours,
                 'country': country_id
-            }
+            },
+            coalesce=True
         )
         print(response.json())
 
         return response.json()
 
+    async def _request(
+            self, 
+            params: Dict, 
+            method: str = 'GET', 
+            coalesce: bool = False, 
+            background: bool = False
+        ) -> Response:
+        '''
+        Запрос к handler_api.php, coalesce - см. RequestGate.request.
+        background=True - запрос идёт через отдельный пул backend puller.
+        '''
+        return await self.requests.request(
+            method, params, lambda: self._send(method, params, background), coalesce
+        )
+
+    async def _send(self, method: str, params: Dict, background: bool = False) -> Response:
+        '''
+        Отправка с таймаутом по action, повторами с jittered backoff
+        (только для идемпотентных действий) и circuit breaker.
+        '''
+        action = params.get('action')
+        timeout = self.action_timeouts.get(action, self.timeout)
+        attempts = 1 + (self.retries if action in self.IDEMPOTENT_ACTIONS else 0)
+
+        for attempt in range(attempts):
+            self.breaker.check()
+            try:
+                # Ожидание лимита внутри try: отмена во время ожидания освобождает пробный запрос
+                await self.requests.wait(background, action=action)
+                client = self.background_client if background else self.client
+                response = await client.request(
+                    method, 'stubs/handler_api.php', params=params, timeout=timeout
+                )
+            except TransportError as e:
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+                self.logger.warning(
+                    f"Повтор запроса - {self.global_name}",
+                    action=action,
+                    attempt=attempt + 1,
+                    error=repr(e)
+                )
+            except BaseException:
+                # Отмена задачи - не ошибка провайдера, освобождаем пробный запрос
+                self.breaker.release()
+                raise
+            else:
+                if response.status_code < 500:
+                    self.breaker.record_success()
+                    return response
+
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    return response
+
+            await asyncio.sleep(backoff_delay(attempt, self.retry_backoff))
+
     async def close(self):
         self._running = False
         await self.client.aclose()
+        await self.background_client.aclose()
 
     async def _backend_puller(self):
         await self.wait_for_database()
+        if self.shard:
+            await self.shard.wait_ready()
         
         while self._running:
+            cycle_start = time.monotonic()
             try:
-                # Проверка обычных SMS заказов
-                active_orders = SmsOrdersDatabase.get_all_active_orders()
-                for order in active_orders:
-                    status = await self.get_status(str(order.order_id))
-                    
-                    if not status:
-                        continue
-                        
-                    if status.startswith('STATUS_OK'):
-                        code = status.split('STATUS_OK:')[1]
-                        await self._process_sms_received(order, code)
-                    elif status == 'STATUS_CANCEL':
-                        await self._process_sms_cancelled(order)
-                    elif status in ['STATUS_WAIT_CODE', 'STATUS_WAIT_RETRY']:
-                        continue
-                    else:
-                        self.logger.warning(
-                            "Неизвестный статус SMS",
-                            status=status,
-                            order_id=order.order_id
-                        )
-
-                # Проверка арендованных номеров
-                rent_orders = RentDatabase.get_active_rent_orders()
-                for rent in rent_orders:
-                    status = await self.get_rent_status(str(rent.order_id))
-                    
-                    if not status or status.get('status') != 'success':
-                        continue
-
-                    # Обработка новых SMS
-                    if int(status.get('quantity', 0)) > 0:
-                        for sms in status['values'].values():
-                            await self._process_rent_sms_received(rent, sms)
-                    
-                    # Проверка статуса аренды
-                    if status.get('message') in ['STATUS_FINISH', 'STATUS_CANCEL', 'STATUS_REVOKE']:
-                        await self._process_rent_finished(rent, status.get('message'))
-                        
+                await self._poll_cycle()
             except Exception as e:
                 self.logger.error(
                     "Ошибка в SMS backend puller",
                     error=str(e)
                 )
-                
-            await asyncio.sleep(10)
+
+            # Длительность цикла = максимальная задержка доставки кода пользователю
+            self.poll_stats['cycles'] += 1
+            self.poll_stats['last_cycle_duration'] = round(time.monotonic() - cycle_start, 3)
+            self.poll_stats['max_cycle_duration'] = max(
+                self.poll_stats['max_cycle_duration'], self.poll_stats['last_cycle_duration']
+            )
+            if self.poll_stats['due']:
+                self.logger.debug("SMS poll cycle", **self.poll_stats)
+
+            # Спим до ближайшей проверки, но не дольше минимального интервала,
+            # чтобы новые заказы из БД попадали в расписание без задержки
+            next_due = self.poll_scheduler.next_due()
+            delay = self.poll_min_interval if next_due is None else next_due - time.monotonic()
+            await asyncio.sleep(min(max(delay, 0.5), self.poll_min_interval))
+
+    async def _poll_cycle(self):
+        now = time.monotonic()
+        active_orders = {
+            ('sms', order.id): order for order in await run_db(SmsOrdersDatabase.get_all_active_orders)
+            if self._owns('sms', order.order_id)
+        }
+        rent_orders = {
+            ('rent', rent.id): rent for rent in await run_db(RentDatabase.get_active_rent_orders)
+            if self._owns('rent', rent.order_id)
+        }
+        self.poll_stats['orders'] = len(active_orders)
+        self.poll_stats['rents'] = len(rent_orders)
+
+        self.poll_scheduler.sync([*active_orders, *rent_orders], now)
+        for rent_id in set(self._rent_quantity) - {key[1] for key in rent_orders}:
+            self._rent_quantity.pop(rent_id, None)
+            self._rent_idle_polls.pop(rent_id, None)
+
+        due = self.poll_scheduler.pop_due(now)
+        due_orders = [active_orders[key] for key in due if key in active_orders]
+        due_rents = [rent_orders[key] for key in due if key in rent_orders]
+        self.poll_stats['due'] = len(due)
+
+        try:
+            await self._poll_due(active_orders, due_orders, due_rents)
+        finally:
+            # Ошибка цикла не снимает заказы с опроса
+            now = time.monotonic()
+            for order in due_orders:
+                self.poll_scheduler.schedule(('sms', order.id), now + self._activation_interval(order))
+            for rent in due_rents:
+                self.poll_scheduler.schedule(('rent', rent.id), now + self._rent_interval(rent))
+
+    async def _poll_due(self, active_orders, due_orders, due_rents):
+        # Один запрос getActiveActivations вместо N запросов getStatus,
+        # по одному getStatus только для заказов, которых нет в ответе
+        # (отменённые/завершённые у провайдера)
+        poll_orders = due_orders
+        if self.bulk_status_sync and due_orders:
+            missing = {order.id for order in await self._sync_active_orders(list(active_orders.values()))}
+            poll_orders = [order for order in due_orders if order.id in missing]
+        self.poll_stats['fallback_requests'] = len(poll_orders)
+
+        semaphore = asyncio.Semaphore(self.poll_concurrency)
+
+        async def limited(poll, item):
+            async with semaphore:
+                try:
+                    await poll(item)
+                except Exception as e:
+                    self.logger.error(
+                        "Ошибка проверки заказа в SMS backend puller",
+                        order_id=item.order_id,
+                        error=str(e)
+                    )
+
+        await asyncio.gather(
+            *(limited(self._poll_order, order) for order in poll_orders),
+            *(limited(self._poll_rent, rent) for rent in due_rents)
+        )
+
+    def _owns(self, kind: str, order_id) -> bool:
+        return self.shard is None or self.shard.owns((kind, str(order_id)))
+
+    def _activation_interval(self, order) -> float:
+        """Свежие активации опрашиваются часто, старые - всё реже"""
+        age = (datetime.now() - order.create_time).total_seconds()
+        return min(max(age / 20, self.poll_min_interval), self.poll_max_interval)
+
+    def _rent_interval(self, rent) -> float:
+        """Экспоненциальный backoff для аренд без новых SMS, но не позже конца аренды"""
+        idle_polls = self._rent_idle_polls.get(rent.id, 0)
+        interval = min(self.poll_min_interval * 2 ** idle_polls, self.rent_poll_max_interval)
+        until_end = (rent.end_date - datetime.now()).total_seconds()
+        return max(min(interval, until_end), self.poll_min_interval)
+
+    async def _sync_active_orders(self, active_orders):
+        """Сверка активных заказов с getActiveActivations, возвращает заказы для getStatus"""
+        try:
+            activations = await self.get_active_activations(background=True)
+        except Exception as e:
+            # Circuit breaker, сеть, неожиданный ответ - опрашиваем каждый заказ через getStatus
+            self.logger.warning(
+                f"Ошибка getActiveActivations, опрос по getStatus - {self.global_name}",
+                error=repr(e)
+            )
+            activations = False
+        if activations is False:
+            return active_orders
+
+        missing_orders = []
+        received = []
+        for order in active_orders:
+            activation = activations.get(str(order.order_id))
+            if activation is None:
+                missing_orders.append(order)
+                continue
+
+            sms_code = activation.get('smsCode')
+            if sms_code:
+                code = sms_code[-1] if isinstance(sms_code, list) else sms_code
+                received.append(self._process_sms_received(order, code))
+
+        # Записи в БД встают в очередь потока БД сразу, а не по одной за цикл
+        await asyncio.gather(*received)
+        return missing_orders
+
+    async def _poll_order(self, order):
+        """Проверка обычного SMS заказа"""
+        status = await self.get_status(str(order.order_id), background=True)
+        
+        if not status:
+            return
+            
+        if status.startswith('STATUS_OK'):
+            code = status.split('STATUS_OK:')[1]
+            await self._process_sms_received(order, code)
+        elif status == 'STATUS_CANCEL':
+            await self._process_sms_cancelled(order)
+        elif status in ['STATUS_WAIT_CODE', 'STATUS_WAIT_RETRY']:
+            return
+        else:
+            self.logger.warning(
+                "Неизвестный статус SMS",
+                status=status,
+                order_id=order.order_id
+            )
+
+    async def _poll_rent(self, rent):
+        """Проверка арендованного номера"""
+        status = await self.get_rent_status(str(rent.order_id), background=True)
+        
+        if not status or status.get('status') != 'success':
+            return
+
+        # Аренда без новых SMS опрашивается всё реже
+        quantity = int(status.get('quantity', 0))
+        if quantity == self._rent_quantity.get(rent.id, 0):
+            self._rent_idle_polls[rent.id] = self._rent_idle_polls.get(rent.id, 0) + 1
+        else:
+            self._rent_idle_polls[rent.id] = 0
+
+            # Обработка новых SMS: уже доставленные отсекаются одним запросом к БД
+            if quantity > 0:
+                new_sms = await run_db(RentDatabase.filter_new_rent_sms, rent.id, list(status['values'].values()))
+                for sms in new_sms:
+                    await self._process_rent_sms_received(rent, sms)
+        self._rent_quantity[rent.id] = quantity
+        
+        # Проверка статуса аренды
+        if status.get('message') in ['STATUS_FINISH', 'STATUS_CANCEL', 'STATUS_REVOKE']:
+            await self._process_rent_finished(rent, status.get('message'))
 
     async def _process_sms_received(self, order, code):
         """Обработка полученного SMS"""
-        await self.bot.send_message(
-            order.user_id,
-            text=self.bot.textgen.get(
-                'common', 'sms_received', 'text',
-                code=code
-            )
+        text = self.bot.textgen.get(
+            'common', 'sms_received', 'text',
+            code=code
         )
-        SmsOrdersDatabase.complete_order(order.order_id)
+
+        def complete() -> bool:
+            with db.atomic():
+                # Код может прийти и через webhook, и через опрос - доставляем один раз
+                if not SmsOrdersDatabase.complete_order(order.order_id):
+                    return False
+
+                OutboxDatabase.add(order.user_id, text, priority='high')
+                return True
+
+        if await run_db(complete):
+            self.bot.outbox.notify()
 
     async def _process_sms_cancelled(self, order):
         """Обработка отмененной активации"""
-        # Возвращаем деньги пользователю
-        UserDatabase.transfer_balance(
-            0,  # system
-            order.user_id,
-            order.price
-        )
-        SmsOrdersDatabase.cancel_order(order.order_id)
-        await self.bot.send_message(
-            order.user_id,
-            text=self.bot.textgen.get(
-                'common', 'sms_cancelled', 'text'
-            )
+        text = self.bot.textgen.get(
+            'common', 'sms_cancelled', 'text'
         )
 
+        def cancel() -> bool:
+            with db.atomic():
+                if not SmsOrdersDatabase.cancel_order(order.order_id):
+                    return False
+
+                # Возвращаем деньги пользователю
+                UserDatabase.transfer_balance(
+                    0,  # system
+                    order.user_id,
+                    order.price,
+                    kind='refund',
+                    ref=order.order_id
+                )
+                OutboxDatabase.add(order.user_id, text)
+                return True
+
+        if await run_db(cancel):
+            self.bot.outbox.notify()
+
     async def _process_rent_sms_received(self, rent, sms_data):
         """Обработка полученного SMS для арендованного номера"""
-        await self.bot.send_message(
-            rent.user_id,
-            text=self.bot.textgen.get(
-                'common', 'rent_sms_received', 'text',
-                phone_from=sms_data['phoneFrom'],
-                text=sms_data['text'],
-                service=sms_data['service'],
-                date=sms_data['date']
-            )
+        text = self.bot.textgen.get(
+            'common', 'rent_sms_received', 'text',
+            phone_from=sms_data['phoneFrom'],
+            text=sms_data['text'],
+            service=sms_data['service'],
+            date=sms_data['date']
         )
 
+        def deliver() -> bool:
+            with db.atomic():
+                # SMS приходят через webhook и при каждом опросе - доставляем один раз
+                if not RentDatabase.mark_rent_sms_delivered(rent.id, sms_data):
+                    return False
+
+                OutboxDatabase.add(rent.user_id, text, priority='high')
+                return True
+
+        if await run_db(deliver):
+            self.bot.outbox.notify()
+
     async def _process_rent_finished(self, rent, status):
         """Обработка завершения аренды"""
-        if status in ['STATUS_CANCEL', 'STATUS_REVOKE']:
-            # Возврат денег при отмене
-            UserDatabase.transfer_balance(
-                0,  # system
-                rent.user_id,
-                rent.price
-            )
-            RentDatabase.cancel_rent_order(rent.id)
-            message = 'rent_cancelled'
-        else:
-            RentDatabase.complete_rent_order(rent.id)
-            message = 'rent_finished'
-            
-        await self.bot.send_message(
-            rent.user_id,
-            text=self.bot.textgen.get(
-                'common', message, 'text'
-            )
+        cancelled = status in ['STATUS_CANCEL', 'STATUS_REVOKE']
+        text = self.bot.textgen.get(
+            'common', 'rent_cancelled' if cancelled else 'rent_finished', 'text'
         )
 
+        def finish() -> bool:
+            with db.atomic():
+                if cancelled:
+                    if not RentDatabase.cancel_rent_order(rent.id):
+                        return False
+
+                    # Возврат денег при отмене
+                    UserDatabase.transfer_balance(
+                        0,  # system
+                        rent.user_id,
+                        rent.price,
+                        kind='refund',
+                        ref=rent.order_id
+                    )
+                elif not RentDatabase.complete_rent_order(rent.id):
+                    return False
+
+                OutboxDatabase.add(rent.user_id, text)
+                return True
+
+        if await run_db(finish):
+            self.bot.outbox.notify()
+
     async def wait_for_database(self):
-        while not GlobalDatabase.tables_is_created():
-            await asyncio.sleep(0.1)
\ No newline at end of file
+        while not await run_db(GlobalDatabase.tables_is_created):
+            await asyncio.sleep(0.1)
@@ -0,0 +1,89 @@
+import hmac
+
+from typing import Dict, Optional
+
+from aiohttp import web
+from structlog.typing import FilteringBoundLogger
+
+from bot.api.sms_client.sms_activate import SMSActivateAPI
+from bot.database import SmsOrdersDatabase, RentDatabase, run_db
+from config.models import Config
+
+
+class SmsActivateWebhook:
+    '''
+    HTTP приёмник webhook'ов SMS-Activate о входящих SMS.
+
+    Активации передаются в SMSActivateAPI._process_sms_received,
+    аренды - в SMSActivateAPI._process_rent_sms_received, то есть тем же путём,
+    что и при опросе. На любой корректный запрос отвечаем 200, иначе
+    SMS-Activate будет повторять доставку.
+    '''
+
+    def __init__(self, sms_activate: SMSActivateAPI, config: Config, logger: FilteringBoundLogger) -> None:
+        self.sms_activate = sms_activate
+        self.logger = logger
+        self.host = config.sms_webhook_host
+        self.port = config.sms_webhook_port
+        self.path = config.sms_webhook_path
+        if not config.sms_webhook_secret:
+            raise ValueError('SMS webhook requires SMS_WEBHOOK_SECRET')
+        self.secret = config.sms_webhook_secret.encode()
+
+        self.app = web.Application()
+        self.app.router.add_post(self.path, self.handle)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+        self.logger.info(f'✅ SMS: webhook listening on {self.host}:{self.port}{self.path}')
+
+    async def close(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(request.query.get('secret', '').encode(), self.secret):
+            return web.Response(status=403)
+
+        try:
+            payload = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            if 'activationId' in payload:
+                await self._process_activation(payload)
+            elif 'rentId' in payload:
+                await self._process_rent(payload)
+        except Exception as e:
+            self.logger.error(
+                "Ошибка обработки webhook SMS-Activate",
+                payload=payload,
+                error=str(e)
+            )
+            return web.Response(status=500)
+
+        return web.Response(text='OK')
+
+    async def _process_activation(self, payload: Dict) -> None:
+        order = await run_db(SmsOrdersDatabase.get_order, str(payload['activationId']))
+        if not order or order.status != 'active':
+            return
+
+        await self.sms_activate._process_sms_received(order, payload.get('code') or payload.get('text'))
+
+    async def _process_rent(self, payload: Dict) -> None:
+        rent = await run_db(RentDatabase.get_active_rent_by_order_id, int(payload['rentId']))
+        if not rent:
+            return
+
+        await self.sms_activate._process_rent_sms_received(rent, {
+            'phoneFrom': payload.get('phoneFrom', ''),
+            'text': payload.get('text', ''),
+            'service': payload.get('service', ''),
+            'date': payload.get('receivedAt', '')
+        })
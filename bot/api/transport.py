@@ -0,0 +1,25 @@
+from httpx import AsyncClient, Limits
+
+from config.models import Config
+
+
+def build_client(config: Config, background: bool = False, **client_kwargs) -> AsyncClient:
+    '''
+    Создание httpx клиента с настройками пула из Config.
+
+    Каждый клиент ходит на один хост (base_url), поэтому лимиты пула
+    клиента - это и есть лимиты на хост. Для фонового опроса создаётся
+    отдельный клиент (background=True) со своим пулом, чтобы pullers
+    не занимали соединения, нужные пользовательским покупкам.
+    '''
+    max_connections = config.http_background_max_connections if background else config.http_max_connections
+
+    return AsyncClient(
+        limits=Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(config.http_max_keepalive_connections, max_connections),
+            keepalive_expiry=config.http_keepalive_expiry
+        ),
+        http2=config.http2_enabled,
+        **client_kwargs
+    )
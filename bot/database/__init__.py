@@ -1,30 +1,88 @@
 from peewee import * 
+from peewee import Node, Tuple as RowValue  # typing.Tuple ниже перекрывает peewee.Tuple
 
-from typing import List, Dict, Tuple, Union, Optional
+from typing import Any, Callable, List, Dict, Tuple, Union, Optional
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import asyncio, functools, hashlib, json
+
+from config.models import Config
+from bot.database.cache import user_cache
 
 
 db = SqliteDatabase('bot/database/database_file/database.sqlite')
 
+# Все запросы к SQLite идут из одного потока: event loop не блокируется,
+# а запись в SQLite всё равно последовательная
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='database')
+
+
+async def run_db(func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Выполняет синхронный вызов peewee в потоке БД.
+    Транзакции (db.atomic) должны целиком жить внутри func.
+    """
+    return await asyncio.get_running_loop().run_in_executor(
+        db_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def keyset_page(
+    query: Select, model: Model, cursor: Optional[int] = None, backward: bool = False, limit: int = 10
+) -> Tuple[List[Model], bool, bool]:
+    """
+    Страница query по убыванию (create_time, id) без OFFSET и COUNT:
+    читается limit + 1 строка по индексу (..., create_time).
+
+    cursor - id крайней строки соседней страницы: без backward страница
+    начинается после неё, с backward - заканчивается перед ней.
+    Возвращает (строки, есть предыдущая страница, есть следующая).
+    """
+    page = query
+    if cursor is not None:
+        key = RowValue(model.create_time, model.id)
+        anchor = model.select(model.create_time, model.id).where(model.id == cursor)
+        page = page.where(key > anchor if backward else key < anchor)
+
+    if backward:
+        page = page.order_by(model.create_time.asc(), model.id.asc())
+    else:
+        page = page.order_by(model.create_time.desc(), model.id.desc())
+
+    rows = list(page.limit(limit + 1))
+    if not rows and cursor is not None:
+        # Строку-курсор удалили - показываем первую страницу
+        return keyset_page(query, model, limit=limit)
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        return rows[::-1], more, True
+    return rows, cursor is not None, more
+
 
 class User(Model):
     id = PrimaryKeyField()
-    username = TextField(null=True)
-    balance = FloatField(default=0)
+    username = TextField(null=True, index=True)
+    balance = FloatField(default=0)  # зеркало balance_minor / 100 для отображения
+    balance_minor = IntegerField(default=0)  # копейки, источник истины - см. LedgerDatabase
+    held_minor = IntegerField(default=0)  # зарезервировано под покупки, см. LedgerDatabase.hold
+    hold_time = DateTimeField(null=True)  # последний резерв, старше hold_ttl - не учитывается
     ref_balance = IntegerField(default=0) # balance included ref_balance  
 
     class Meta:
         database = db 
 
 class Referal(Model):
-    from_user = IntegerField()
-    to_user = IntegerField()
+    from_user = IntegerField(index=True)
+    to_user = IntegerField(index=True)
 
     class Meta:
         database = db 
 
 class Invoices(Model):
-    invoice_id = TextField() # use uuid4 for telegram stars and integer for cryptobot
+    invoice_id = TextField(index=True) # use uuid4 for telegram stars and integer for cryptobot
     user_id = IntegerField()
     payment_provider = TextField()
     create_time = DateTimeField()
@@ -33,10 +91,13 @@ class Invoices(Model):
 
     class Meta:
         database = db 
+        indexes = (
+            (('status', 'payment_provider', 'create_time'), False),
+        )
 
 class SmsOrder(Model):
     id = PrimaryKeyField()
-    order_id = TextField()  # ID активации от SMS-activate
+    order_id = TextField(index=True)  # ID активации от SMS-activate
     user_id = IntegerField()
     phone = TextField()  # Номер телефона
     service = TextField()  # Код сервиса
@@ -48,6 +109,10 @@ class SmsOrder(Model):
 
     class Meta:
         database = db
+        indexes = (
+            (('user_id', 'create_time'), False),
+            (('status', 'create_time'), False),
+        )
 
 class Favorites(Model):
     user_id = IntegerField()
@@ -58,10 +123,13 @@ class Favorites(Model):
 
     class Meta:
         database = db
+        indexes = (
+            (('user_id', 'create_time'), False),
+        )
 
 
 class RentNumber(Model):
-    order_id = IntegerField()
+    order_id = IntegerField(index=True)
     user_id = IntegerField()
     phone = TextField()
     start_date = DateTimeField(default=datetime.now)  
@@ -71,12 +139,81 @@ class RentNumber(Model):
     
     class Meta:
         database = db
+        indexes = (
+            (('status', 'end_date'), False),
+            (('user_id', 'start_date'), False),
+        )
+
+
+class RentSms(Model):
+    rent_id = IntegerField()  # RentNumber.id
+    sms_key = TextField()  # sha1(phoneFrom + text), см. RentDatabase.rent_sms_key
+    create_time = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        indexes = (
+            (('rent_id', 'sms_key'), True),
+        )
+
+
+class WorkerLease(Model):
+    worker_id = TextField(unique=True)  # host:pid, см. Config.worker_id
+    heartbeat = DateTimeField(default=datetime.now)
+    start_time = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = 'worker_leases'
+
+
+class Outbox(Model):
+    chat_id = IntegerField()
+    priority = TextField(default='normal')  # high, normal, low - см. bot/utils/send_queue.py
+    payload = TextField()  # json: text, keyboard (ключи textgen), kwargs для send_message
+    attempts = IntegerField(default=0)
+    next_attempt = DateTimeField(default=datetime.now)
+    claim = TextField(null=True)  # кто из drainer'ов сейчас доставляет
+    create_time = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        indexes = (
+            (('next_attempt',), False),
+            (('claim',), False),
+        )
+
+
+class LedgerEntry(Model):
+    user_id = IntegerField()
+    amount_minor = IntegerField()  # копейки, со знаком
+    kind = TextField()  # см. LedgerDatabase.kinds
+    ref = TextField(null=True)  # id счёта / заказа / промокода
+    create_time = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = 'ledger'
+        indexes = (
+            (('user_id', 'create_time'), False),
+        )
+
+
+class SchemaVersion(Model):
+    version = IntegerField(primary_key=True)  # см. bot/database/migrations.py
+    name = TextField()
+    applied_at = DateTimeField(default=datetime.now)
+
+    class Meta:
+        database = db
+        table_name = 'schema_version'
 
 
 class Promo(Model):
-    code = TextField()
+    code = TextField(index=True)
     activates = IntegerField()
     amount = IntegerField()
+    used = IntegerField(default=0)  # число PromoUse, меняется вместе с ними
 
     class Meta:
         database = db 
@@ -88,6 +225,9 @@ class PromoUse(Model):
 
     class Meta:
         database = db 
+        indexes = (
+            (('promo_id', 'user_id'), True),
+        )
 
 
 
@@ -120,29 +260,92 @@ class RentDatabase:
         return RentNumber.get(RentNumber.id == order_id)
 
     @staticmethod
-    def cancel_rent_order(order_id: int) -> bool:
-        order = RentNumber.get_or_none(RentNumber.id == order_id)
-        if not order or order.status != 'active':
-            return False
+    def get_active_rent_by_order_id(order_id: int) -> Optional[RentNumber]:
+        """Поиск активной аренды по ID аренды SMS-activate"""
+        return RentNumber.get_or_none(
+            (RentNumber.order_id == order_id) &
+            (RentNumber.status == 'active')
+        )
 
-        order.status = 'cancelled'
-        order.save()
-        return True
+    @staticmethod
+    def rent_sms_key(sms_data: Dict[str, str]) -> str:
+        """
+        Ключ SMS аренды: отправитель + текст без учёта регистра и пробелов.
+        Дата в ключ не входит - опрос (values[*].date) и webhook (receivedAt,
+        может отсутствовать) передают её в разных форматах
+        """
+        phone_from = ''.join(ch for ch in str(sms_data.get('phoneFrom') or '').lower() if ch.isalnum())
+        text = ' '.join(str(sms_data.get('text') or '').split())
+        return hashlib.sha1(f"{phone_from}|{text}".encode()).hexdigest()
 
     @staticmethod
-    def complete_rent_order(order_id: int) -> bool:
-        order = RentNumber.get_or_none(RentNumber.id == order_id)
-        if not order or order.status != 'active':
+    def legacy_rent_sms_key(sms_data: Dict[str, str]) -> str:
+        """Прежний ключ sha1(date|text) - SMS, доставленные до его замены, не отправляются повторно"""
+        return hashlib.sha1(
+            f"{sms_data.get('date', '')}|{sms_data.get('text', '')}".encode()
+        ).hexdigest()
+
+    @staticmethod
+    def filter_new_rent_sms(rent_id: int, sms_list: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """Оставляет только SMS, которые ещё не доставлялись пользователю (один SELECT)"""
+        keys = {RentDatabase.rent_sms_key(sms): sms for sms in sms_list}
+        legacy_keys = {RentDatabase.legacy_rent_sms_key(sms): key for key, sms in keys.items()}
+        delivered = {
+            legacy_keys.get(row.sms_key, row.sms_key) for row in RentSms.select(RentSms.sms_key).where(
+                (RentSms.rent_id == rent_id) &
+                (RentSms.sms_key.in_([*keys, *legacy_keys]))
+            )
+        }
+        return [sms for key, sms in keys.items() if key not in delivered]
+
+    @staticmethod
+    def mark_rent_sms_delivered(rent_id: int, sms_data: Dict[str, str]) -> bool:
+        """Отмечает SMS доставленной, False если она уже была доставлена"""
+        try:
+            with db.atomic():
+                RentSms.create(rent_id=rent_id, sms_key=RentDatabase.rent_sms_key(sms_data))
+            return True
+        except IntegrityError:
             return False
 
-        order.status = 'expired'
-        order.save()
-        return True
+    @staticmethod
+    def cancel_rent_order(order_id: int) -> bool:
+        """Отменяет аренду, False если аренда уже не активна"""
+        return RentNumber.update(status='cancelled').where(
+            (RentNumber.id == order_id) &
+            (RentNumber.status == 'active')
+        ).execute() > 0
+
+    @staticmethod
+    def complete_rent_order(order_id: int) -> bool:
+        """Завершает аренду, False если аренда уже не активна"""
+        return RentNumber.update(status='expired').where(
+            (RentNumber.id == order_id) &
+            (RentNumber.status == 'active')
+        ).execute() > 0
 
 
 
 class GlobalDatabase:
-    tables = [User, Referal, Invoices, SmsOrder, Favorites, RentNumber, PromoUse, Promo] # change if you add another table in db
+    tables = [User, Referal, Invoices, SmsOrder, Favorites, RentNumber, RentSms, WorkerLease, Outbox, LedgerEntry, SchemaVersion, PromoUse, Promo] # change if you add another table in db
+    pragmas = ['journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'busy_timeout']
+
+    @staticmethod
+    def configure(config: Config) -> None:
+        """Профиль SQLite из конфига, применяется к каждому новому соединению"""
+        db.init(db.database, pragmas={
+            'journal_mode': config.sqlite_journal_mode,
+            'synchronous': config.sqlite_synchronous,
+            'cache_size': config.sqlite_cache_size,
+            'mmap_size': config.sqlite_mmap_size,
+            'temp_store': config.sqlite_temp_store,
+            'busy_timeout': config.sqlite_busy_timeout
+        }, timeout=config.sqlite_busy_timeout / 1000)
+
+    @staticmethod
+    def get_pragmas() -> Dict[str, Any]:
+        """Фактические значения pragma текущего соединения"""
+        return {pragma: db.pragma(pragma) for pragma in GlobalDatabase.pragmas}
 
     @staticmethod
     def create_tables() -> List[Model]:
@@ -157,54 +360,386 @@ class GlobalDatabase:
                 
         return now_created
     
+    @staticmethod
+    def create_indexes() -> List[str]:
+        """Создаёт индексы, которых нет в уже существующей базе (IF NOT EXISTS)"""
+        existing = {index.name for table in db.get_tables() for index in db.get_indexes(table)}
+        with db.atomic():
+            for table in GlobalDatabase.tables:
+                table._schema.create_indexes(safe=True)
+
+        return sorted(
+            {index.name for table in db.get_tables() for index in db.get_indexes(table)} - existing
+        )
+
+    @staticmethod
+    def hot_queries() -> Dict[str, Select]:
+        """Запросы горячих путей (с условиями как в коде) для проверки плана"""
+        now = datetime.now()
+        return {
+            'user_by_username': User.select().where(User.username == ''),
+            'referal_by_from_user': Referal.select().where(Referal.from_user == 0),
+            'referal_by_to_user': Referal.select().where(Referal.to_user == 0),
+            'invoice_by_id': Invoices.select().where(Invoices.invoice_id == ''),
+            'actual_invoices': Invoices.select().where(
+                (Invoices.status == 'active') &
+                (Invoices.create_time >= now) &
+                (Invoices.payment_provider == '')
+            ),
+            'sms_order_by_id': SmsOrder.select().where(SmsOrder.order_id == ''),
+            'user_sms_orders': SmsOrder.select().where(
+                (SmsOrder.user_id == 0) &
+                (RowValue(SmsOrder.create_time, SmsOrder.id) < RowValue(now, 0))
+            ).order_by(SmsOrder.create_time.desc(), SmsOrder.id.desc()).limit(6),
+            'active_sms_orders': SmsOrder.select().where(
+                (SmsOrder.status == 'active') &
+                (SmsOrder.create_time >= now)
+            ),
+            'user_favorites': Favorites.select().where(
+                (Favorites.user_id == 0) &
+                (RowValue(Favorites.create_time, Favorites.id) < RowValue(now, 0))
+            ).order_by(Favorites.create_time.desc(), Favorites.id.desc()).limit(11),
+            'user_rent_orders': RentNumber.select().where(
+                RentNumber.user_id == 0
+            ).order_by(RentNumber.start_date.desc()),
+            'active_rent_orders': RentNumber.select().where(
+                (RentNumber.status == 'active') &
+                (RentNumber.end_date >= now)
+            ),
+            'rent_by_order_id': RentNumber.select().where(
+                (RentNumber.order_id == 0) &
+                (RentNumber.status == 'active')
+            ),
+            'promo_by_code': Promo.select().where(Promo.code == ''),
+            'promo_use': PromoUse.select().where(
+                (PromoUse.promo_id == 0) &
+                (PromoUse.user_id == 0)
+            ),
+            'outbox_pending': Outbox.select(Outbox.id).where(Outbox.next_attempt <= now).order_by(Outbox.next_attempt)
+        }
+
+    @staticmethod
+    def check_query_plans() -> Dict[str, str]:
+        """EXPLAIN QUERY PLAN горячих запросов: {запрос: шаг плана} для полных сканирований таблиц"""
+        full_scans = {}
+        for name, query in GlobalDatabase.hot_queries().items():
+            sql, params = query.sql()
+            for row in db.execute_sql(f'EXPLAIN QUERY PLAN {sql}', params):
+                detail = row[-1]
+                if detail.startswith('SCAN') and 'INDEX' not in detail:
+                    full_scans[name] = detail
+        return full_scans
+
     @staticmethod
     def tables_is_created() -> bool:
-        return all(table._meta.table_name in db.get_tables() for table in GlobalDatabase.tables)
+        """Таблицы созданы и все миграции применены - можно запускать puller'ы"""
+        from bot.database.migrations import schema_is_current
+
+        return all(table._meta.table_name in db.get_tables() for table in GlobalDatabase.tables) and schema_is_current()
+
+
+class LeaseDatabase:
+    @staticmethod
+    def heartbeat(worker_id: str) -> None:
+        """Продлевает аренду воркера (создаёт запись при первом вызове)"""
+        WorkerLease.insert(worker_id=worker_id).on_conflict(
+            conflict_target=[WorkerLease.worker_id],
+            update={WorkerLease.heartbeat: datetime.now()}
+        ).execute()
+
+    @staticmethod
+    def get_live_workers(lease_ttl: int) -> List[str]:
+        """Воркеры, продлевавшие аренду за последние lease_ttl секунд"""
+        expire_delta = datetime.now() - timedelta(seconds=lease_ttl)
+        return [
+            lease.worker_id
+            for lease in WorkerLease.select(WorkerLease.worker_id).where(
+                WorkerLease.heartbeat >= expire_delta
+            ).order_by(WorkerLease.worker_id)
+        ]
+
+    @staticmethod
+    def release(worker_id: str) -> None:
+        WorkerLease.delete().where(WorkerLease.worker_id == worker_id).execute()
+
+    @staticmethod
+    def delete_expired(lease_ttl: int) -> int:
+        expire_delta = datetime.now() - timedelta(seconds=lease_ttl * 10)
+        return WorkerLease.delete().where(WorkerLease.heartbeat < expire_delta).execute()
+
+
+class OutboxDatabase:
+    # Лимит переменных SQLite в одном запросе
+    CHUNK_SIZE = 500
+
+    @staticmethod
+    def add(
+        chat_id: int,
+        text: str,
+        priority: str = 'normal',
+        keyboard: Optional[List[str]] = None,
+        **kwargs
+    ) -> int:
+        """Уведомление пользователю. Вызывать в той же транзакции, что и смену состояния"""
+        return Outbox.create(
+            chat_id=chat_id,
+            priority=priority,
+            payload=json.dumps({'text': text, 'keyboard': keyboard, 'kwargs': kwargs}, ensure_ascii=False)
+        ).id
+
+    @staticmethod
+    def claim_batch(claim: str, limit: int, claim_ttl: int) -> List[Outbox]:
+        """Забирает до limit готовых к отправке уведомлений на claim_ttl секунд"""
+        now = datetime.now()
+        pending = Outbox.select(Outbox.id).where(
+            Outbox.next_attempt <= now
+        ).order_by(Outbox.next_attempt).limit(limit)
+
+        with db.atomic():
+            Outbox.update(
+                claim=claim,
+                next_attempt=now + timedelta(seconds=claim_ttl)
+            ).where(Outbox.id.in_(pending)).execute()
+            return list(Outbox.select().where(Outbox.claim == claim))
+
+    @staticmethod
+    def extend_claims(claims: List[str], claim_ttl: int) -> int:
+        """Продлевает claim строк, которые ещё ждут отправки в SendQueue"""
+        return Outbox.update(
+            next_attempt=datetime.now() + timedelta(seconds=claim_ttl)
+        ).where(Outbox.claim.in_(claims)).execute()
+
+    @staticmethod
+    def delete_delivered(ids: List[int]) -> None:
+        with db.atomic():
+            for start in range(0, len(ids), OutboxDatabase.CHUNK_SIZE):
+                Outbox.delete().where(
+                    Outbox.id.in_(ids[start:start + OutboxDatabase.CHUNK_SIZE])
+                ).execute()
+
+    @staticmethod
+    def retry_later(ids: List[int], delay: float) -> None:
+        next_attempt = datetime.now() + timedelta(seconds=delay)
+        with db.atomic():
+            for start in range(0, len(ids), OutboxDatabase.CHUNK_SIZE):
+                Outbox.update(
+                    attempts=Outbox.attempts + 1,
+                    next_attempt=next_attempt,
+                    claim=None
+                ).where(
+                    Outbox.id.in_(ids[start:start + OutboxDatabase.CHUNK_SIZE])
+                ).execute()
+
+
+class LedgerDatabase:
+    """
+    Балансы в копейках (User.balance_minor) и журнал проводок (ledger).
+
+    Баланс меняется только через apply() / capture(): условный UPDATE без
+    предварительного SELECT (списание не уводит баланс в минус) и одна строка
+    в ledger на каждое изменение. Сумма проводок пользователя всегда равна
+    его balance_minor - это проверяет fold().
+
+    Покупка у внешнего API: hold() до запроса, capture() при успехе,
+    release() при ошибке - каждый шаг один условный UPDATE. Резерв уменьшает
+    доступные средства, поэтому параллельные покупки не проходят проверку
+    вдвоём. Резерв, который не вернул упавший процесс, перестаёт учитываться
+    через hold_ttl секунд после последнего hold().
+    """
+    kinds = ('deposit', 'purchase', 'refund', 'transfer', 'referral', 'promo', 'opening')
+    hold_ttl = 600  # см. Config.balance_hold_ttl
+
+    @staticmethod
+    def to_minor(amount: float) -> int:
+        return int(round(amount * 100))
+
+    @staticmethod
+    def _held() -> Node:
+        """SQL-выражение действующего резерва пользователя"""
+        expired = User.hold_time < datetime.now() - timedelta(seconds=LedgerDatabase.hold_ttl)
+        return Case(None, [(expired, 0)], User.held_minor)
+
+    @staticmethod
+    def available_minor(user: User) -> int:
+        """Доступные средства уже загруженного пользователя"""
+        if user.hold_time and user.hold_time < datetime.now() - timedelta(seconds=LedgerDatabase.hold_ttl):
+            return user.balance_minor
+        return user.balance_minor - user.held_minor
+
+    @staticmethod
+    def _change(
+        user_id: int, amount_minor: int, kind: str, ref: Optional[str], condition: Optional[Node] = None, **fields
+    ) -> bool:
+        where = User.id == user_id
+        if condition is not None:
+            where &= condition
+
+        updated = User.update(
+            balance_minor=User.balance_minor + amount_minor,
+            balance=(User.balance_minor + amount_minor) / 100.0,
+            **fields
+        ).where(where).execute()
+        if not updated:
+            return False
+
+        LedgerEntry.create(
+            user_id=user_id,
+            amount_minor=amount_minor,
+            kind=kind,
+            ref=None if ref is None else str(ref)
+        )
+        user_cache.invalidate(user_id)
+        return True
+
+    @staticmethod
+    def apply(user_id: int, amount_minor: int, kind: str, ref: Optional[str] = None) -> bool:
+        """
+        Меняет баланс на amount_minor и пишет проводку.
+        False - пользователя нет или не хватает средств (резерв не тратится).
+        Вызывается внутри db.atomic() вместе с остальными изменениями операции.
+        """
+        condition = None
+        if amount_minor < 0:
+            condition = User.balance_minor - LedgerDatabase._held() >= -amount_minor
+        return LedgerDatabase._change(user_id, amount_minor, kind, ref, condition)
+
+    @staticmethod
+    def hold(user_id: int, amount_minor: int) -> bool:
+        """Резервирует amount_minor, False - не хватает доступных средств"""
+        held = LedgerDatabase._held()
+        reserved = User.update(
+            held_minor=held + amount_minor,
+            hold_time=datetime.now()
+        ).where(
+            (User.id == user_id) &
+            (User.balance_minor - held >= amount_minor)
+        ).execute()
+        user_cache.invalidate(user_id)
+        return reserved > 0
+
+    @staticmethod
+    def capture(user_id: int, amount_minor: int, kind: str = 'purchase', ref: Optional[str] = None) -> bool:
+        """
+        Списывает зарезервированные amount_minor и пишет проводку.
+        False - только если резерв просрочен и средства уже потрачены.
+        """
+        return LedgerDatabase._change(
+            user_id, -amount_minor, kind, ref,
+            User.balance_minor >= amount_minor,
+            held_minor=fn.MAX(User.held_minor - amount_minor, 0)
+        )
+
+    @staticmethod
+    def release(user_id: int, amount_minor: int) -> None:
+        """Возвращает резерв, если покупка не состоялась"""
+        User.update(
+            held_minor=fn.MAX(User.held_minor - amount_minor, 0)
+        ).where(User.id == user_id).execute()
+        user_cache.invalidate(user_id)
+
+    @staticmethod
+    def fold() -> Dict[int, Tuple[int, int]]:
+        """Сверка за один проход: {user_id: (balance_minor, сумма проводок)} для расхождений"""
+        totals = LedgerEntry.select(
+            LedgerEntry.user_id,
+            fn.SUM(LedgerEntry.amount_minor).alias('total')
+        ).group_by(LedgerEntry.user_id).alias('totals')
+        total = fn.COALESCE(totals.c.total, 0)
+
+        query = User.select(User.id, User.balance_minor, total.alias('total')).join(
+            totals, JOIN.LEFT_OUTER, on=(totals.c.user_id == User.id)
+        ).where(User.balance_minor != total)
+        return {user.id: (user.balance_minor, user.total) for user in query.objects()}
 
 
 class UserDatabase:
     def __init__(self, user_id: int, username: str = None) -> None:
         self.user_id = user_id
         self.username = username
-        self.user = User.get_or_none(User.id == user_id)
+        self.user = user_cache.get(user_id)
+        if self.user is None:
+            self.user = User.get_or_none(User.id == user_id)
+            if self.user:
+                user_cache.put(user_id, self.user)
     
     def new_user(self) -> None:
         if self.user:
             if self.user.username != self.username:
-                User.update(username=None).where(
-                    (User.username == self.username) & 
-                    (User.id != self.user_id)
-                ).execute()
-                User.update(username=self.username).where(User.id == self.user_id).execute()
+                user_cache.set_username(self.user_id, self.username)
 
         else:
-            User.create(id=self.user_id, username=self.username)
+            self.user = User.create(id=self.user_id, username=self.username)
+            user_cache.put(self.user_id, self.user)
+
+    @staticmethod
+    def touch_cached(user_id: int, username: str = None) -> bool:
+        """new_user() без запросов к БД, если пользователь есть в кэше"""
+        user = user_cache.get(user_id)
+        if user is None:
+            return False
+
+        if user.username != username:
+            user_cache.set_username(user_id, username)
+        return True
+
+    @staticmethod
+    def flush_usernames() -> int:
+        """Пачкой записывает накопленные смены username"""
+        pending = user_cache.take_pending_usernames()
+        if not pending:
+            return 0
+
+        with db.atomic():
+            for user_id, username in pending.items():
+                if username is not None:
+                    # username уникален - у прежнего владельца сбрасываем
+                    previous_owners = [
+                        user.id for user in User.select(User.id).where(
+                            (User.username == username) &
+                            (User.id != user_id)
+                        )
+                    ]
+                    if previous_owners:
+                        User.update(username=None).where(User.id.in_(previous_owners)).execute()
+                        user_cache.invalidate(*previous_owners)
+
+                User.update(username=username).where(User.id == user_id).execute()
+        return len(pending)
     
     def check_balance_available(self, amount: float) -> bool:
-        return self.user.balance >= amount
+        return LedgerDatabase.available_minor(self.user) >= LedgerDatabase.to_minor(amount)
     
     @staticmethod
     def get_user_id_by_username(username: str):
         return User.get_or_none(User.username == username)
     
     @staticmethod
-    def transfer_balance(from_user_id: int, to_user_id: int, amount: float, is_ref: bool = False) -> bool:
+    def transfer_balance(
+        from_user_id: int,
+        to_user_id: int,
+        amount: float,
+        is_ref: bool = False,
+        kind: str = 'transfer',
+        ref: Optional[str] = None
+    ) -> bool:
+        """
+        Перевод amount между пользователями, 0 - система (покупка, пополнение, возврат).
+        False - не хватает средств или получателя нет, тогда ничего не меняется.
+        """
+        amount_minor = LedgerDatabase.to_minor(amount)
         try:
-            with db.atomic():
+            with db.atomic() as transaction:
                 # Снимаем баланс у отправителя
                 if from_user_id != 0:
-                    from_user = User.get(User.id == from_user_id)
-                    if from_user.balance < amount:
+                    if not LedgerDatabase.apply(from_user_id, -amount_minor, kind, ref):
                         return False
-                    
-                    User.update(
-                        balance=User.balance - amount
-                    ).where(
-                        User.id == from_user_id
-                    ).execute()
 
                 # Начисляем баланс получателю
                 if to_user_id != 0:
+                    if not LedgerDatabase.apply(to_user_id, amount_minor, kind, ref):
+                        transaction.rollback()
+                        return False
+
                     # Обновляем реферальный баланс
                     if is_ref:
                         User.update(
@@ -212,14 +747,7 @@ class UserDatabase:
                         ).where(
                             User.id == to_user_id
                         ).execute()
-                    
-                    # Обновляем основной баланс
-                    User.update(
-                        balance=User.balance + amount
-                    ).where(
-                        User.id == to_user_id
-                    ).execute()
-                    
+
             return True
             
         except Exception as e:
@@ -257,14 +785,20 @@ class InvoicesDatabase:
         return Invoices.get(Invoices.invoice_id == invoice_id).payment_message_id
     
     @staticmethod
-    def success_invoice(invoice_id: str, amount: int) -> Tuple[int, int]: # type: ignore
+    def success_invoice(invoice_id: str, amount: int) -> Union[Tuple[int, int], None]: # type: ignore
+        """Зачисляет оплату, None если счёт уже оплачен (например, другим воркером)"""
         invoice = Invoices.get(Invoices.invoice_id == invoice_id)
-        user = User.get(User.id == invoice.user_id)
 
-        Invoices.update(status = 'paid').where(Invoices.id == invoice.id).execute()
-        User.update(balance=user.balance + amount).where(User.id == invoice.user_id).execute()
+        with db.atomic():
+            paid = Invoices.update(status='paid').where(
+                (Invoices.id == invoice.id) &
+                (Invoices.status == 'active')
+            ).execute()
+            if not paid:
+                return None
+            LedgerDatabase.apply(invoice.user_id, LedgerDatabase.to_minor(amount), 'deposit', invoice_id)
         
-        return user.id, invoice.payment_message_id
+        return invoice.user_id, invoice.payment_message_id
 
     @staticmethod
     def get_actual_invoices_id(timeout: int, payment_provider: str) -> List[int]:
@@ -333,7 +867,9 @@ class ReferalDatabase:
         UserDatabase.transfer_balance(
             0, # system
             referal.from_user,
-            referal_amount
+            referal_amount,
+            is_ref=True,
+            kind='referral'
         )
 
 
@@ -360,10 +896,14 @@ class SmsOrdersDatabase:
             price=price
         )
     
-    def get_all_user_orders(self) -> List[SmsOrder]:
-        return list(SmsOrder.select().where(
-            SmsOrder.user_id == self.user_id
-        ).order_by(SmsOrder.create_time.desc()))
+    def get_user_orders_page(
+        self, cursor: Optional[int] = None, backward: bool = False, limit: int = 5
+    ) -> Tuple[List[SmsOrder], bool, bool]:
+        """Страница истории активаций, см. keyset_page"""
+        return keyset_page(
+            SmsOrder.select().where(SmsOrder.user_id == self.user_id),
+            SmsOrder, cursor, backward, limit
+        )
     
     @staticmethod
     def get_order(order_id: str) -> Optional[SmsOrder]:
@@ -379,24 +919,19 @@ class SmsOrdersDatabase:
     
     @staticmethod
     def complete_order(order_id: str) -> bool:
-        order = SmsOrder.get_or_none(SmsOrder.order_id == order_id)
-        if not order or order.status != 'active':
-            return False
-            
-        order.status = 'completed'
-        order.save()
-        return True
+        """Завершает заказ, False если заказ уже не активен"""
+        return SmsOrder.update(status='completed').where(
+            (SmsOrder.order_id == order_id) &
+            (SmsOrder.status == 'active')
+        ).execute() > 0
     
     @staticmethod
     def cancel_order(order_id: str) -> bool:
-        """Отменяет заказ"""
-        order = SmsOrder.get_or_none(SmsOrder.order_id == order_id)
-        if not order or order.status != 'active':
-            return False
-            
-        order.status = 'cancelled'
-        order.save()
-        return True
+        """Отменяет заказ, False если заказ уже не активен"""
+        return SmsOrder.update(status='cancelled').where(
+            (SmsOrder.order_id == order_id) &
+            (SmsOrder.status == 'active')
+        ).execute() > 0
 
 
 class FavoritesDatabase:
@@ -408,10 +943,14 @@ class FavoritesDatabase:
             user_id=self.user_id, service=service, service_name=service_name, country_id=country_id
         ).id
     
-    def get_favorites_list(self) -> List[Favorites]:
-        return list(Favorites.select().where(
-            Favorites.user_id == self.user_id
-        ).order_by(Favorites.create_time.desc()))
+    def get_favorites_page(
+        self, cursor: Optional[int] = None, backward: bool = False, limit: int = 10
+    ) -> Tuple[List[Favorites], bool, bool]:
+        """Страница избранного, см. keyset_page"""
+        return keyset_page(
+            Favorites.select().where(Favorites.user_id == self.user_id),
+            Favorites, cursor, backward, limit
+        )
     
     @staticmethod
     def get_favorite_by_id(favorite_id: int) -> Favorites:
@@ -443,7 +982,8 @@ class PromoDatabase:
     
     def activate_promo(self, promo_code: str) -> (bool, str): # type: ignore
         """
-        Активирует промокод для пользователя
+        Активирует промокод для пользователя одной транзакцией:
+        уникальная строка PromoUse, условное увеличение used и начисление
         :param promo_code: Код промокода
         :return: (Успех активации, Сообщение)
         """
@@ -452,29 +992,29 @@ class PromoDatabase:
         if not promo:
             return False, "Промокод не найден"
             
-        # Проверяем, использовал ли пользователь этот промокод
-        if PromoUse.select().where(
-            (PromoUse.promo_id == promo.id) & 
-            (PromoUse.user_id == self.user_id)
-        ).exists():
-            return False, "Вы уже использовали этот промокод"
-            
-        # Проверяем количество активаций
-        used_count = PromoUse.select().where(PromoUse.promo_id == promo.id).count()
-        if used_count >= promo.activates:
-            return False, "Промокод больше не действителен"
-            
-        # Активируем промокод
-        with db.atomic():
-            PromoUse.create(
-                promo_id=promo.id,
-                user_id=self.user_id
-            )
-            UserDatabase.transfer_balance(
-                0,  # system
-                self.user_id,
-                promo.amount
-            )
+        with db.atomic() as transaction:
+            # Уникальный индекс (promo_id, user_id) - повторная активация не пройдёт
+            try:
+                with db.atomic():
+                    PromoUse.create(
+                        promo_id=promo.id,
+                        user_id=self.user_id
+                    )
+            except IntegrityError:
+                return False, "Вы уже использовали этот промокод"
+                
+            # Проверяем и занимаем активацию одним UPDATE
+            claimed = Promo.update(used=Promo.used + 1).where(
+                (Promo.id == promo.id) &
+                (Promo.used < Promo.activates)
+            ).execute()
+            if not claimed:
+                transaction.rollback()
+                return False, "Промокод больше не действителен"
+                
+            if not LedgerDatabase.apply(self.user_id, LedgerDatabase.to_minor(promo.amount), 'promo', promo.id):
+                transaction.rollback()
+                return False, "Промокод больше не действителен"
             
         return True, f"Промокод активирован! Начислено: {promo.amount}"
     
@@ -488,13 +1028,12 @@ class PromoDatabase:
         if not promo:
             return None
             
-        used_count = PromoUse.select().where(PromoUse.promo_id == promo.id).count()
         return {
             "code": promo.code,
             "amount": promo.amount,
             "activates": promo.activates,
-            "used": used_count,
-            "remaining": promo.activates - used_count
+            "used": promo.used,
+            "remaining": promo.activates - promo.used
         }
     
     @staticmethod
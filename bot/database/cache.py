@@ -0,0 +1,92 @@
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class UserCache:
+    '''
+    LRU-кэш строк User по Telegram id для UserDatabase и UserDatabaseMiddleware.
+
+    Запись живёт ttl секунд (балансы меняют и другие процессы бота),
+    после локального изменения баланса - сбрасывается через invalidate.
+    Смены username не пишутся сразу: последняя смена на пользователя
+    копится в pending_usernames и сбрасывается пачкой
+    (UserDatabase.flush_usernames).
+
+    Кэш используют и event loop, и поток БД - все операции под lock.
+    Модуль не импортирует bot.database, чтобы __init__ мог импортировать его.
+    '''
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: 'OrderedDict[int, Tuple[float, Any]]' = OrderedDict()
+        self._pending_usernames: Dict[int, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def configure(self, maxsize: int, ttl: float) -> None:
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._evict()
+
+    def get(self, user_id: int) -> Any:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, user: Any) -> None:
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), user)
+            self._entries.move_to_end(user_id)
+            self._evict()
+
+    def invalidate(self, *user_ids: int) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def set_username(self, user_id: int, username: Optional[str]) -> None:
+        '''Меняет username в кэше и ставит запись в очередь на сброс в БД'''
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                entry[1].username = username
+            self._pending_usernames[user_id] = username
+
+    def take_pending_usernames(self) -> Dict[int, Optional[str]]:
+        with self._lock:
+            pending, self._pending_usernames = self._pending_usernames, {}
+        return pending
+
+    def _evict(self) -> None:
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'pending_usernames': len(self._pending_usernames)
+        }
+
+
+user_cache = UserCache()
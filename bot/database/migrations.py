@@ -0,0 +1,159 @@
+'''
+Версионные миграции схемы.
+
+Миграция - функция, зарегистрированная через @migration(version, name).
+Применённые версии хранятся в таблице schema_version, при запуске
+run_migrations() применяет недостающие по возрастанию версии.
+
+База, созданная с нуля (GlobalDatabase.create_tables создал таблицу User),
+уже соответствует текущим моделям - миграции только отмечаются применёнными.
+
+Миграция может прерваться на середине (рестарт), поэтому она должна
+быть идемпотентной: версия записывается только после её завершения.
+
+Правила для больших таблиц:
+- новые колонки - add_column(), nullable или с default (ALTER TABLE ADD COLUMN
+  в SQLite не переписывает таблицу);
+- заполнение данных - backfill(), пачками по batch_size строк в отдельных
+  транзакциях, чтобы не держать блокировку записи;
+- индексы - GlobalDatabase.create_indexes() (CREATE INDEX IF NOT EXISTS).
+'''
+
+from typing import Callable, Dict, List, Tuple
+
+from datetime import datetime
+
+from peewee import DateTimeField, Field, IntegerField, Model, Node, fn
+from playhouse.migrate import SqliteMigrator, migrate
+
+from bot.database import db, GlobalDatabase, LedgerEntry, Promo, PromoUse, SchemaVersion, User
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[], None]]] = []
+
+migrator = SqliteMigrator(db)
+
+
+def migration(version: int, name: str) -> Callable:
+    def register(func: Callable[[], None]) -> Callable[[], None]:
+        MIGRATIONS.append((version, name, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return register
+
+
+def add_column(model: Model, name: str, field: Field) -> None:
+    '''ALTER TABLE ADD COLUMN, если колонки ещё нет'''
+    table = model._meta.table_name
+    if name not in {column.name for column in db.get_columns(table)}:
+        migrate(migrator.add_column(table, name, field))
+
+
+def backfill(model: Model, update: Dict, where: Node, batch_size: int = 1000) -> int:
+    '''
+    UPDATE model SET update WHERE where - пачками по batch_size строк.
+    where должно перестать выполняться для обновлённых строк,
+    иначе цикл не закончится.
+    '''
+    total = 0
+    while True:
+        batch = model.select(model._meta.primary_key).where(where).limit(batch_size)
+        with db.atomic():
+            updated = model.update(update).where(model._meta.primary_key.in_(batch)).execute()
+        total += updated
+        if updated < batch_size:
+            return total
+
+
+def schema_is_current() -> bool:
+    if SchemaVersion._meta.table_name not in db.get_tables():
+        return False
+    applied = {row.version for row in SchemaVersion.select(SchemaVersion.version)}
+    return all(version in applied for version, _, _ in MIGRATIONS)
+
+
+def run_migrations(created_tables: List[Model]) -> List[str]:
+    '''Применяет недостающие миграции, возвращает их имена'''
+    SchemaVersion.create_table(safe=True)
+    applied = {row.version for row in SchemaVersion.select(SchemaVersion.version)}
+    fresh_database = User in created_tables
+
+    now_applied = []
+    for version, name, func in MIGRATIONS:
+        if version in applied:
+            continue
+
+        if not fresh_database:
+            func()
+            now_applied.append(f'{version}_{name}')
+        SchemaVersion.create(version=version, name=name)
+
+    return now_applied
+
+
+def _dedupe_promo_uses() -> None:
+    """Повторные активации (гонка до уникального индекса) - оставляем первую"""
+    first_uses = PromoUse.select(fn.MIN(PromoUse.id)).group_by(PromoUse.promo_id, PromoUse.user_id)
+    PromoUse.delete().where(PromoUse.id.not_in(first_uses)).execute()
+
+
+@migration(1, 'hot_lookup_indexes')
+def _hot_lookup_indexes() -> None:
+    # create_indexes() строит индексы текущих моделей, включая уникальный PromoUse
+    _dedupe_promo_uses()
+    GlobalDatabase.create_indexes()
+
+
+@migration(2, 'balance_minor_ledger')
+def _balance_minor_ledger() -> None:
+    add_column(User, 'balance_minor', IntegerField(default=0))
+    backfill(
+        User,
+        {User.balance_minor: fn.ROUND(User.balance * 100)},
+        User.balance_minor != fn.ROUND(User.balance * 100)
+    )
+
+    # Входящий остаток - первая проводка, чтобы сверка сходилась.
+    # Пользователи с проводками пропускаются - миграцию можно перезапустить
+    last_id = 0
+    while True:
+        users = list(User.select(User.id, User.balance_minor).where(
+            (User.id > last_id) &
+            (User.balance_minor != 0) &
+            ~fn.EXISTS(LedgerEntry.select().where(LedgerEntry.user_id == User.id))
+        ).order_by(User.id).limit(1000))
+        if not users:
+            return
+
+        with db.atomic():
+            LedgerEntry.insert_many([
+                {
+                    'user_id': user.id,
+                    'amount_minor': user.balance_minor,
+                    'kind': 'opening',
+                    'create_time': datetime.now()
+                } for user in users
+            ]).execute()
+        last_id = users[-1].id
+
+
+@migration(3, 'balance_holds')
+def _balance_holds() -> None:
+    add_column(User, 'held_minor', IntegerField(default=0))
+    add_column(User, 'hold_time', DateTimeField(null=True))
+
+
+@migration(4, 'promo_used_counter')
+def _promo_used_counter() -> None:
+    add_column(Promo, 'used', IntegerField(default=0))
+
+    _dedupe_promo_uses()
+
+    table = PromoUse._meta.table_name
+    for index in db.get_indexes(table):
+        if index.columns == ['promo_id', 'user_id'] and not index.unique:
+            migrate(migrator.drop_index(table, index.name))
+    GlobalDatabase.create_indexes()
+
+    uses = PromoUse.select(fn.COUNT(PromoUse.id)).where(PromoUse.promo_id == Promo.id)
+    backfill(Promo, {Promo.used: uses}, Promo.used != uses)
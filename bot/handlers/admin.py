@@ -4,7 +4,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 
 from bot.models import CustomMessage, CustomCallbackQuery
-from bot.database import PromoDatabase
+from bot.database import PromoDatabase, run_db
 from bot.filters import AdminFilter
 
 
@@ -108,7 +108,8 @@ async def promo_enter_amount(message: CustomMessage, state: FSMContext):
     data = await state.get_data()
     await state.clear()
     
-    promo = PromoDatabase.create_promo(
+    promo = await run_db(
+        PromoDatabase.create_promo,
         code=data['code'],
         activates=data['activates'],
         amount=int(message.text)
@@ -132,13 +133,13 @@ async def list_promos(call: CustomCallbackQuery):
     if not await AdminFilter(call.bot.config)(call):
         return
         
-    promos = PromoDatabase.get_all_promos()
+    promos = await run_db(PromoDatabase.get_all_promos)
     
     await call.message.edit_text(
         text=call.bot.textgen.get(
             'admin', 'promo_list', 'text',
             promos="\n".join([
-                f"- Код: {p.code} | Активаций: {p.activates} | Сумма: {p.amount}₽ | Удалить: /delete_{p.id} "
+                f"- Код: {p.code} | Активаций: {p.used}/{p.activates} | Сумма: {p.amount}₽ | Удалить: /delete_{p.id} "
                 for p in promos
             ]) if promos else "Нет активных промокодов"
         ),
@@ -155,7 +156,7 @@ async def delete_promo(message: CustomMessage):
         
     promo_code = int(message.text.split('_')[1])
 
-    if PromoDatabase.delete_promo(promo_code):
+    if await run_db(PromoDatabase.delete_promo, promo_code):
         await message.reply("Промокод успешно удален")
     else:
         await message.reply("Промокод не найден")
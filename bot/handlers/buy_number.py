@@ -6,8 +6,9 @@ from aiogram.fsm.context import FSMContext
 
 from bot.models import CustomMessage, CustomCallbackQuery
 from bot.filters import TextGeneratorFilter
-from bot.database import UserDatabase, SmsOrdersDatabase, FavoritesDatabase, RentDatabase
+from bot.database import db, UserDatabase, SmsOrdersDatabase, FavoritesDatabase, RentDatabase, LedgerDatabase, run_db
 from bot.utils import generate_country_buttons, generate_service_buttons
+from bot.utils.purchase import purchase, NOT_AVAILABLE
 from bot.states import BuyNumber, Rent
 
 router = Router()
@@ -253,45 +254,36 @@ async def rent_created(call: CustomCallbackQuery, state: FSMContext):
     _, service, country_id, hours = call.data.split('_')
     hours = int(hours)
 
-    user_db = UserDatabase(call.from_user.id)
     response = await call.bot.sms_activate.get_rent_price(service, int(country_id), hours)
     price = response['services'][service]['cost'] * hours
+    price_minor = LedgerDatabase.to_minor(price)
 
-    if not user_db.check_balance_available(price):
-        return await call.answer(
-            text=call.bot.textgen.get('errors', 'insufficient_funds_sms', 'text'),
-            show_alert=True
-        )
-
-    number_data = await call.bot.sms_activate.rent_number(
-        service, hours, int(country_id)
+    number_data, error = await purchase(
+        call.from_user.id,
+        price_minor,
+        acquire=lambda: call.bot.sms_activate.rent_number(service, hours, int(country_id)),
+        record=lambda number: RentDatabase(call.from_user.id).create_rent_order(
+            number['id'],
+            number['number'], 
+            datetime.strptime(number['endDate'], '%Y-%m-%d %H:%M:%S'),  # Исправленный формат
+            price
+        ),
+        cancel=lambda number: call.bot.sms_activate.set_rent_status(str(number['id']), 2),
+        logger=call.bot.logger
     )
-
-    if not number_data:
+    if error:
         return await call.answer(
-            text=call.bot.textgen.get('errors', 'number_not_available', 'text'),
+            text=call.bot.textgen.get(
+                'errors', 'number_not_available' if error == NOT_AVAILABLE else 'insufficient_funds_sms', 'text'
+            ),
             show_alert=True
         )
 
-    # Списываем баланс
-    UserDatabase.transfer_balance(
-        call.from_user.id,
-        0,  # system
-        price
-    )
-
     flag = call.bot.textgen.get('flags', country_id, "flag")
     country_name = call.bot.textgen.get('flags', country_id, "name_ru")
 
     expires_at = datetime.strptime(number_data['endDate'], '%Y-%m-%d %H:%M:%S').strftime('%d.%m.%Y %H:%M')
 
-    RentDatabase(call.from_user.id).create_rent_order(
-        number_data['id'],
-        number_data['number'], 
-        datetime.strptime(number_data['endDate'], '%Y-%m-%d %H:%M:%S'),  # Исправленный формат
-        price
-    )
-
     await call.message.edit_text(
         text=call.bot.textgen.get(
             'action', 'rent_success', 'text',
@@ -318,40 +310,31 @@ async def create_new_sms_invoice(call: CustomCallbackQuery):
 
     service_name, service_code, country_id, price = args
     price = float(price)
+    price_minor = LedgerDatabase.to_minor(price)
 
-    if not UserDatabase(call.from_user.id).check_balance_available(price):
-        return await call.answer(
-            text=call.bot.textgen.get('errors', 'insufficient_funds_sms', 'text'),
-            show_alert=True
-        )
-    
-    number_data = await call.bot.sms_activate.get_number(
-        service_code, int(country_id)
+    number_data, error = await purchase(
+        call.from_user.id,
+        price_minor,
+        acquire=lambda: call.bot.sms_activate.get_number(service_code, int(country_id)),
+        record=lambda number: SmsOrdersDatabase(call.from_user.id).create_order(
+            order_id=number['id'],
+            phone=number['phone'],
+            service=service_code,
+            service_name=service_name,
+            coutry_id=int(country_id),
+            price=price
+        ),
+        cancel=lambda number: call.bot.sms_activate.set_status(str(number['id']), 8),
+        logger=call.bot.logger
     )
-    
-    if not number_data:
+    if error:
         return await call.answer(
-            text=call.bot.textgen.get('errors', 'number_not_available', 'text'),
+            text=call.bot.textgen.get(
+                'errors', 'number_not_available' if error == NOT_AVAILABLE else 'insufficient_funds_sms', 'text'
+            ),
             show_alert=True
         )
 
-    # Списываем баланс
-    UserDatabase.transfer_balance(
-        call.from_user.id,
-        0,  # system
-        price
-    )
-
-    # Создаем заказ в БД
-    SmsOrdersDatabase(call.from_user.id).create_order(
-        order_id=number_data['id'],
-        phone=number_data['phone'],
-        service=service_code,
-        service_name=service_name,
-        coutry_id=int(country_id),
-        price=price
-    )
-
     await call.message.edit_text(
         text=call.bot.textgen.get(
             'common', 'success_invoice_sms', 'text',
@@ -368,7 +351,7 @@ async def create_new_sms_invoice(call: CustomCallbackQuery):
 @router.callback_query(F.data.startswith('cancel_sms_'))
 async def cancel_sms_order(call: CustomCallbackQuery):
     order_id = int(call.data.replace('__newline','').split('_')[-1])
-    order = SmsOrdersDatabase.get_order(order_id)
+    order = await run_db(SmsOrdersDatabase.get_order, order_id)
     timeout = (datetime.now() - order.create_time).total_seconds() 
 
     # не забыть убрать
@@ -390,18 +373,26 @@ async def cancel_sms_order(call: CustomCallbackQuery):
             show_alert=True
         )
     
-    # Отменяем активацию в API
-    await call.bot.sms_activate.set_status(str(order_id), 8)
-    
-    # Возвращаем деньги
-    UserDatabase.transfer_balance(
-        0, # system
-        call.from_user.id,
-        order.price
-    )
+    # Отменяем активацию в API, без отмены у провайдера деньги не возвращаем
+    if not await call.bot.sms_activate.set_status(str(order_id), 8):
+        return await call.answer(
+            text=call.bot.textgen.get('errors', 'provider_unavailable', 'text'),
+            show_alert=True
+        )
     
-    # Отмечаем заказ как отмененный
-    SmsOrdersDatabase.cancel_order(order_id)
+    # Отмечаем заказ как отмененный и возвращаем деньги одной транзакцией
+    def cancel_and_refund():
+        with db.atomic():
+            if SmsOrdersDatabase.cancel_order(order_id):
+                UserDatabase.transfer_balance(
+                    0, # system
+                    call.from_user.id,
+                    order.price,
+                    kind='refund',
+                    ref=order_id
+                )
+
+    await run_db(cancel_and_refund)
     
     await call.message.edit_text(
         text=call.bot.textgen.get('common', 'order_cancelled', 'text')
@@ -410,7 +401,7 @@ async def cancel_sms_order(call: CustomCallbackQuery):
 @router.callback_query(F.data.startswith('resend_sms_'))
 async def resend_sms_code(call: CustomCallbackQuery):
     order_id = int(call.data.replace('__newline','').split('_')[-1])
-    order = SmsOrdersDatabase.get_order(order_id)
+    order = await run_db(SmsOrdersDatabase.get_order, order_id)
     
     if not order or order.user_id != call.from_user.id:
         return await call.answer(
@@ -425,7 +416,11 @@ async def resend_sms_code(call: CustomCallbackQuery):
         )
     
     # Запрашиваем повторную отправку SMS
-    await call.bot.sms_activate.set_status(str(order_id), 6)
+    if not await call.bot.sms_activate.set_status(str(order_id), 6):
+        return await call.answer(
+            text=call.bot.textgen.get('errors', 'provider_unavailable', 'text'),
+            show_alert=True
+        )
     
     await call.answer(
         text=call.bot.textgen.get('common', 'sms_resent', 'text'),
@@ -436,9 +431,10 @@ async def resend_sms_code(call: CustomCallbackQuery):
 @router.callback_query(F.data.startswith('favorites_'))
 async def add_order_to_favorites(call: CustomCallbackQuery):
     order_id = int(call.data.replace('__newline','').split('_')[-1])
-    order = SmsOrdersDatabase.get_order(order_id)
+    order = await run_db(SmsOrdersDatabase.get_order, order_id)
 
-    favorite_id = FavoritesDatabase(call.from_user.id).create_new_favorite(
+    favorite_id = await run_db(
+        FavoritesDatabase(call.from_user.id).create_new_favorite,
         order.service, order.service_name, int(order.coutry_id)
     )
     
@@ -461,8 +457,8 @@ async def add_order_to_favorites(call: CustomCallbackQuery):
     favorite_id, order_id  = map(int, [call_args[-1], call_args[-2]])
 
 
-    order = SmsOrdersDatabase.get_order(order_id)
-    FavoritesDatabase.delete_favorite(favorite_id)
+    order = await run_db(SmsOrdersDatabase.get_order, order_id)
+    await run_db(FavoritesDatabase.delete_favorite, favorite_id)
 
 
     await call.message.edit_text(
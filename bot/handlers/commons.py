@@ -2,11 +2,11 @@ from aiogram import Router, F
 from aiogram.filters import StateFilter
 from aiogram.fsm.context import FSMContext
 
-from bot.utils import generate_country_buttons, generate_favorites_buttons, generate_service_buttons
+from bot.utils import generate_country_buttons, generate_favorites_buttons, generate_service_buttons, get_favorites_prices
 from bot.models import CustomMessage, CustomCallbackQuery
-from bot.database import FavoritesDatabase, UserDatabase, SmsOrdersDatabase
+from bot.database import FavoritesDatabase, UserDatabase, SmsOrdersDatabase, run_db
 
-from bot.utils import generate_activation_history_buttons
+from bot.utils import generate_activation_history_buttons, HISTORY_PER_PAGE, FAVORITES_PER_PAGE
 
 
 router = Router()
@@ -14,7 +14,7 @@ router = Router()
 
 @router.callback_query(F.data.in_(['back|profile', 'back|profile__newline', 'cancel|profile']), StateFilter('*'))
 async def back_to_profile(call: CustomCallbackQuery, state: FSMContext):
-    user_db = UserDatabase(call.from_user.id)
+    user_db = await run_db(UserDatabase, call.from_user.id)
 
     await state.clear()
     await call.message.edit_text(
@@ -98,9 +98,11 @@ async def back_to_get_services(call: CustomCallbackQuery):
 
 @router.callback_query(F.data.startswith('back|activation_history'))
 async def back_to_activation_history(call: CustomCallbackQuery):
-    activation_history = SmsOrdersDatabase(call.from_user.id).get_all_user_orders()
+    activation_history, has_prev, has_next = await run_db(
+        SmsOrdersDatabase(call.from_user.id).get_user_orders_page, limit=HISTORY_PER_PAGE
+    )
 
-    buttons = generate_activation_history_buttons(call.bot.textgen, activation_history)
+    buttons = generate_activation_history_buttons(call.bot.textgen, activation_history, has_prev, has_next)
     buttons.extend(
         [call.bot.textgen.get('common', 'back', 'buttons', back_type='profile')]
     )
@@ -114,9 +116,14 @@ async def back_to_activation_history(call: CustomCallbackQuery):
 
 @router.callback_query(F.data.startswith('back|favorites'))
 async def back_to_favorites(call: CustomCallbackQuery):
+    favorites, has_prev, has_next = await run_db(
+        FavoritesDatabase(call.from_user.id).get_favorites_page, limit=FAVORITES_PER_PAGE
+    )
     favorites_list = generate_favorites_buttons(
         call.bot.textgen, 
-        FavoritesDatabase(call.from_user.id).get_favorites_list()
+        favorites,
+        get_favorites_prices(call.bot.sms_activate, call.bot.config.service_fee, favorites),
+        has_prev, has_next
     )
     await call.message.edit_text(
         text=call.bot.textgen.get('common', 'favorites_list', 'text'),
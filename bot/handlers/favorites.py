@@ -1,7 +1,7 @@
 from aiogram import Router, F
 
 from bot.models import CustomCallbackQuery
-from bot.database import FavoritesDatabase
+from bot.database import FavoritesDatabase, run_db
 from bot.api.payments import CalculatorAsset
 from bot.utils import * 
 
@@ -12,9 +12,14 @@ router = Router()
 @router.callback_query(F.data.startswith('get-favorite'))
 async def get_favorite_action(call: CustomCallbackQuery):
     favorite_id = int(call.data.split('_')[-1])
-    favorite_data = FavoritesDatabase.get_favorite_by_id(favorite_id)
+    favorite_data = await run_db(FavoritesDatabase.get_favorite_by_id, favorite_id)
 
     api_amount = await call.bot.sms_activate.get_price(favorite_data.service, favorite_data.country_id)
+    if api_amount is None:
+        return await call.answer(
+            text=call.bot.textgen.get('errors', 'provider_unavailable', 'text'),
+            show_alert=True
+        )
     amount = CalculatorAsset.conver_price_with_fee(api_amount, call.bot.config.service_fee)
 
     await call.message.edit_text(
@@ -38,13 +43,35 @@ async def get_favorite_action(call: CustomCallbackQuery):
 @router.callback_query(F.data.startswith('delete-sms-by-favorites'))
 async def delete_favorites(call: CustomCallbackQuery):
     favorite_id = int(call.data.split('_')[-1])
-    FavoritesDatabase.delete_favorite(favorite_id)
+    await run_db(FavoritesDatabase.delete_favorite, favorite_id)
 
+    favorites, has_prev, has_next = await run_db(
+        FavoritesDatabase(call.from_user.id).get_favorites_page, limit=FAVORITES_PER_PAGE
+    )
     favorites_list = generate_favorites_buttons(
         call.bot.textgen, 
-        FavoritesDatabase(call.from_user.id).get_favorites_list()
+        favorites,
+        get_favorites_prices(call.bot.sms_activate, call.bot.config.service_fee, favorites),
+        has_prev, has_next
     )
     await call.message.edit_text(
         text=call.bot.textgen.get('common', 'favorites_list', 'text'),
         reply_markup=call.bot.textgen.generate_inline_markup_object(favorites_list)
+    )
+
+
+@router.callback_query(F.data.startswith('favorites-page'))
+async def change_favorites_page(call: CustomCallbackQuery):
+    cursor, backward = parse_keyset_navigation(call.data)
+    favorites, has_prev, has_next = await run_db(
+        FavoritesDatabase(call.from_user.id).get_favorites_page, cursor, backward, FAVORITES_PER_PAGE
+    )
+    favorites_list = generate_favorites_buttons(
+        call.bot.textgen, 
+        favorites,
+        get_favorites_prices(call.bot.sms_activate, call.bot.config.service_fee, favorites),
+        has_prev, has_next
+    )
+    await call.message.edit_reply_markup(
+        reply_markup=call.bot.textgen.generate_inline_markup_object(favorites_list)
     )
\ No newline at end of file
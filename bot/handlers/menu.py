@@ -2,8 +2,8 @@ from aiogram import Router
 
 from bot.models import CustomMessage, CustomCallbackQuery
 from bot.filters import TextGeneratorFilter
-from bot.database import UserDatabase, FavoritesDatabase
-from bot.utils import generate_favorites_buttons
+from bot.database import UserDatabase, FavoritesDatabase, run_db
+from bot.utils import generate_favorites_buttons, get_favorites_prices, FAVORITES_PER_PAGE
 
 
 router = Router()
@@ -14,7 +14,7 @@ default_menu_buttons_path = ['action', 'start', 'buttons'] # action/start/button
     'profile', *default_menu_buttons_path
 ))
 async def profile_handler(message: CustomMessage):
-    user_db = UserDatabase(message.from_user.id)
+    user_db = await run_db(UserDatabase, message.from_user.id)
     
     await message.answer(
         message.bot.textgen.get(
@@ -44,9 +44,14 @@ async def info_handler(message: CustomMessage):
     'favorites', *default_menu_buttons_path
 ))
 async def favorites_handler(message: CustomMessage):
+    favorites, has_prev, has_next = await run_db(
+        FavoritesDatabase(message.from_user.id).get_favorites_page, limit=FAVORITES_PER_PAGE
+    )
     favorites_list = generate_favorites_buttons(
         message.bot.textgen, 
-        FavoritesDatabase(message.from_user.id).get_favorites_list()
+        favorites,
+        get_favorites_prices(message.bot.sms_activate, message.bot.config.service_fee, favorites),
+        has_prev, has_next
     )
     await message.answer(
         text=message.bot.textgen.get('common', 'favorites_list', 'text'),
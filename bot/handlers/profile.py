@@ -6,7 +6,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.filters import StateFilter
 
 from bot.models import CustomMessage, CustomCallbackQuery
-from bot.database import InvoicesDatabase, PromoDatabase, UserDatabase, ReferalDatabase, SmsOrdersDatabase
+from bot.database import db, InvoicesDatabase, PromoDatabase, UserDatabase, ReferalDatabase, SmsOrdersDatabase, run_db
 from bot.states import Deposit, TransferBalance, Promo
 from bot.api.payments import CalculatorAsset
 from bot.utils import * 
@@ -81,8 +81,8 @@ async def activate_promo_handler(call: CustomCallbackQuery, state: FSMContext):
 @router.message(StateFilter(Promo.wait))
 async def promocode_entered_handler(message: CustomMessage, state: FSMContext):
     state_data = await state.get_data()
-    result = PromoDatabase(message.from_user.id).activate_promo(message.text)
-    user_db = UserDatabase(message.from_user.id)
+    result = await run_db(PromoDatabase(message.from_user.id).activate_promo, message.text)
+    user_db = await run_db(UserDatabase, message.from_user.id)
 
     await message.reply('✅' if result[0] else '❌' + f' <b>{result[1]}</b>')
     await message.bot.delete_message(message.chat.id, state_data['message_id'])
@@ -145,7 +145,8 @@ async def crypto_bot_order_created(message: CustomMessage, state: FSMContext):
             'action', 'new_payment_created', 'buttons', to_pay_url=result['mini_app_invoice_url']
         )
     )
-    InvoicesDatabase(message.from_user.id).create_new_invoice(
+    await run_db(
+        InvoicesDatabase(message.from_user.id).create_new_invoice,
         str(result['invoice_id']), "crypto_bot", _message.message_id
     )
     await state.clear()
@@ -208,7 +209,8 @@ async def create_payment_stars(message: CustomMessage, state: FSMContext):
             additional_custom={"cancel_type": "choose_payment_type__answer"}
        )
     )
-    InvoicesDatabase(message.from_user.id).create_new_invoice(
+    await run_db(
+        InvoicesDatabase(message.from_user.id).create_new_invoice,
         ivoice_uuid, 'stars', _message.message_id
     )
     await state.clear()
@@ -217,7 +219,8 @@ async def create_payment_stars(message: CustomMessage, state: FSMContext):
 @router.pre_checkout_query()
 async def on_pre_checkout_query(pre_checkout_query: PreCheckoutQuery):
     await pre_checkout_query.answer(
-        ok=InvoicesDatabase(pre_checkout_query.from_user.id).validate_payment(
+        ok=await run_db(
+            InvoicesDatabase(pre_checkout_query.from_user.id).validate_payment,
             json.loads(pre_checkout_query.invoice_payload)
         )
     )
@@ -227,16 +230,24 @@ async def on_pre_checkout_query(pre_checkout_query: PreCheckoutQuery):
 async def on_successful_stars_payment(message: CustomMessage):
     invoice_data = json.loads(message.successful_payment.invoice_payload)
 
-    user_db = InvoicesDatabase(message.from_user.id)
-    user_db.success_invoice(invoice_data['invoice_id'], invoice_data['amount_rub'])
+    def success_payment():
+        with db.atomic():
+            paid_invoice = InvoicesDatabase.success_invoice(invoice_data['invoice_id'], invoice_data['amount_rub'])
+            if not paid_invoice:
+                return None
 
-    ref_owner = ReferalDatabase.get_referal_owner(message.from_user.id)
-    if ref_owner:
-        ReferalDatabase.process_referal_payment(ref_owner, invoice_data['amount_rub'], message.bot.config.referal_fee)
+            ref_owner = ReferalDatabase.get_referal_owner(message.from_user.id)
+            if ref_owner:
+                ReferalDatabase.process_referal_payment(ref_owner, invoice_data['amount_rub'], message.bot.config.referal_fee)
+            return paid_invoice
+
+    paid_invoice = await run_db(success_payment)
+    if not paid_invoice:
+        return
 
     try:
         await message.bot.delete_message(
-            message.chat.id, user_db.get_invoice_payment_message(invoice_data['invoice_id'])
+            message.chat.id, paid_invoice[1]
         )
     except:
         pass 
@@ -285,7 +296,7 @@ async def get_username_for_transfer(message: CustomMessage, state: FSMContext):
             )
         ) 
     
-    to_user = UserDatabase.get_user_id_by_username(username)
+    to_user = await run_db(UserDatabase.get_user_id_by_username, username)
 
     if not to_user:
         return await message.answer(
@@ -295,10 +306,11 @@ async def get_username_for_transfer(message: CustomMessage, state: FSMContext):
             )
         ) 
     
+    user_db = await run_db(UserDatabase, message.from_user.id)
     await message.answer(
         text=message.bot.textgen.get(
             'action', 'transfer_balance', 'amount', 'text',
-            amount=UserDatabase(message.from_user.id).user.balance
+            amount=user_db.user.balance
         ), reply_markup=message.bot.textgen.generate_inline_markup(
            *cancel_buttons, cancel_type="profile"
        )
@@ -323,7 +335,8 @@ async def complete_transfer(message: CustomMessage, state: FSMContext):
     
     amount = int(amount)
 
-    if not UserDatabase(message.from_user.id).check_balance_available(amount):
+    user_db = await run_db(UserDatabase, message.from_user.id)
+    if not user_db.check_balance_available(amount):
         return await message.answer(
             message.bot.textgen.get('errors', 'insufficient_funds', 'text'),
             reply_markup=message.bot.textgen.generate_inline_markup(
@@ -331,24 +344,31 @@ async def complete_transfer(message: CustomMessage, state: FSMContext):
             )
         )
     
-    UserDatabase.transfer_balance(
+    # Проверка выше не атомарна с переводом: резерв или покупка между ними
+    # оставляют списание невыполненным - получателю ничего не отправляем
+    if not await run_db(
+        UserDatabase.transfer_balance,
         message.from_user.id, state_data['to'], amount
-    )
-    try:
-        await message.bot.send_message(
-            state_data['to'], text=message.bot.textgen.get(
-                'action', 'transfer_balance', 'success_to', 'text',
-                username=message.from_user.username, amount=amount
+    ):
+        return await message.answer(
+            message.bot.textgen.get('errors', 'insufficient_funds', 'text'),
+            reply_markup=message.bot.textgen.generate_inline_markup(
+                *cancel_buttons, cancel_type="profile"
             )
         )
-    except:
-        pass 
+    message.bot.send_queue.send_message(
+        state_data['to'], text=message.bot.textgen.get(
+            'action', 'transfer_balance', 'success_to', 'text',
+            username=message.from_user.username, amount=amount
+        )
+    )
 
+    user_db = await run_db(UserDatabase, message.from_user.id)
     await message.answer(
         text=message.bot.textgen.get(
             'action', 'transfer_balance', 'success_from', 'text',
             username=state_data['to_username'], amount=amount, 
-            balance=UserDatabase(message.from_user.id).user.balance,
+            balance=user_db.user.balance,
         ), reply_markup=message.bot.textgen.generate_keyboard_markup(
             'action', 'start', 'buttons'
         )
@@ -360,12 +380,14 @@ async def complete_transfer(message: CustomMessage, state: FSMContext):
 @router.callback_query(F.data == 'ref_menu')
 async def referals_handler(call: CustomCallbackQuery):
     referal_url = generate_referal_url(call.bot.bot_username, call.from_user.id)
+    count_invited = await run_db(ReferalDatabase.get_referals_count, call.from_user.id)
+    earned_amount = await run_db(ReferalDatabase.get_all_referal_earned, call.from_user.id)
     await call.message.edit_text(
         text=call.bot.textgen.get(
             'action', 'referal', 'text',
-            count_invited=ReferalDatabase.get_referals_count(call.from_user.id),
+            count_invited=count_invited,
             percent=int(call.bot.config.referal_fee * 100), ref_url=referal_url,
-            earned_amount=ReferalDatabase.get_all_referal_earned(call.from_user.id)
+            earned_amount=earned_amount
         ), reply_markup=call.bot.textgen.generate_inline_markup(
             'action', 'referal', 'buttons', 
             ref_tg_url=generate_referal_button_url(referal_url),
@@ -377,9 +399,11 @@ async def referals_handler(call: CustomCallbackQuery):
 
 @router.callback_query(F.data.startswith('activation_history'))
 async def get_activation_history_handler(call: CustomCallbackQuery):
-    activation_history = SmsOrdersDatabase(call.from_user.id).get_all_user_orders()
+    activation_history, has_prev, has_next = await run_db(
+        SmsOrdersDatabase(call.from_user.id).get_user_orders_page, limit=HISTORY_PER_PAGE
+    )
 
-    buttons = generate_activation_history_buttons(call.bot.textgen, activation_history)
+    buttons = generate_activation_history_buttons(call.bot.textgen, activation_history, has_prev, has_next)
     buttons.extend(
         [call.bot.textgen.get(*back_to_menu, back_type='profile')]
     )
@@ -391,10 +415,27 @@ async def get_activation_history_handler(call: CustomCallbackQuery):
     )
 
 
+@router.callback_query(F.data.startswith('history-page'))
+async def change_activation_history_page(call: CustomCallbackQuery):
+    cursor, backward = parse_keyset_navigation(call.data)
+    activation_history, has_prev, has_next = await run_db(
+        SmsOrdersDatabase(call.from_user.id).get_user_orders_page, cursor, backward, HISTORY_PER_PAGE
+    )
+
+    buttons = generate_activation_history_buttons(call.bot.textgen, activation_history, has_prev, has_next)
+    buttons.extend(
+        [call.bot.textgen.get(*back_to_menu, back_type='profile')]
+    )
+
+    await call.message.edit_reply_markup(
+        reply_markup=call.bot.textgen.generate_inline_markup_object(buttons)
+    )
+
+
 @router.callback_query(F.data.startswith('get-order-info'))
 async def get_order_info(call: CustomCallbackQuery):
     order_id = int(call.data.split('_')[-1])
-    order = SmsOrdersDatabase.get_order(order_id)
+    order = await run_db(SmsOrdersDatabase.get_order, order_id)
     castom_country_data = lambda arg: call.bot.textgen.get(*FLAG_PATH, str(order.coutry_id), arg)
 
     await call.message.edit_text(
@@ -5,8 +5,9 @@ from aiogram.fsm.state import State, StatesGroup
 
 from bot.models import CustomMessage, CustomCallbackQuery
 from bot.filters import TextGeneratorFilter
-from bot.database import UserDatabase, RentDatabase
+from bot.database import UserDatabase, RentDatabase, LedgerDatabase, run_db
 from bot.utils import generate_rent_countries_button
+from bot.utils.purchase import purchase, NOT_AVAILABLE
 from bot.api.payments import CalculatorAsset
 
 
@@ -88,7 +89,8 @@ async def process_hours_input(message: CustomMessage, state: FSMContext):
     )
     
     # Проверяем баланс
-    if not UserDatabase(message.from_user.id).check_balance_available(amount):
+    user_db = await run_db(UserDatabase, message.from_user.id)
+    if not user_db.check_balance_available(amount):
         await state.clear()
         return await message.answer(
             text=message.bot.textgen.get('errors', 'rent_insufficient_funds', 'text')
@@ -120,36 +122,40 @@ async def confirm_rent(call: CustomCallbackQuery):
     _, _, country_id, hours, amount = call.data.split('_')
     hours = int(hours)
     amount = float(amount)
-    
+    amount_minor = LedgerDatabase.to_minor(amount)
+    expires_at = datetime.now() + timedelta(hours=hours)
+
     # Получаем номер в аренду
-    rent_response = await call.bot.sms_activate.rent_number(
-        country_id=country_id,
-        hours=hours
+    async def rent_number():
+        rent_response = await call.bot.sms_activate.rent_number(
+            country_id=country_id,
+            hours=hours
+        )
+        if rent_response and 'phone' in rent_response:
+            return rent_response
+
+    rent_response, error = await purchase(
+        call.from_user.id,
+        amount_minor,
+        acquire=rent_number,
+        record=lambda rent: RentDatabase(call.from_user.id).create_rent_order(
+            phone=rent['phone'],
+            end_date=expires_at,
+            price=amount,
+            order_id=rent.get('id', 0)
+        ),
+        cancel=lambda rent: call.bot.sms_activate.set_rent_status(str(rent.get('id')), 2),
+        logger=call.bot.logger
     )
-    
-    if not rent_response or 'phone' not in rent_response:
+    if error:
         return await call.answer(
-            text=call.bot.textgen.get('errors', 'number_not_available', 'text'),
+            text=call.bot.textgen.get(
+                'errors', 'number_not_available' if error == NOT_AVAILABLE else 'rent_insufficient_funds', 'text'
+            ),
             show_alert=True
         )
 
     phone = rent_response['phone']
-    expires_at = datetime.now() + timedelta(hours=hours)
-    
-    # Списываем баланс
-    UserDatabase.transfer_balance(
-        call.from_user.id,
-        0,  # system
-        amount
-    )
-    
-    # Сохраняем в БД
-    RentDatabase(call.from_user.id).create_rent_order(
-        phone=phone,
-        end_date=expires_at,
-        price=amount,
-        order_id=rent_response.get('id', 0)
-    )
 
     country_flag = call.bot.textgen.get('flags', str(country_id), 'flag')
     country_name = call.bot.textgen.get('flags', str(country_id), 'name_ru')
@@ -3,7 +3,7 @@ from aiogram.filters import CommandStart
 
 from bot.models import CustomMessage
 from bot.middlewares import UserDatabaseMiddleware
-from bot.database import ReferalDatabase
+from bot.database import ReferalDatabase, run_db
 from bot.utils import get_user_from_start
 
 
@@ -16,7 +16,7 @@ async def new_user_handler(message: CustomMessage):
     ref_user = get_user_from_start(message.text)
     if ref_user:
         try:
-            ReferalDatabase.add_referal(ref_user, message.from_user.id)
+            await run_db(ReferalDatabase.add_referal, ref_user, message.from_user.id)
         except Exception as unique_err:
             message.bot.logger.err(f"New referal err: {unique_err}")
 
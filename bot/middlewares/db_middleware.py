@@ -2,7 +2,7 @@ from typing import Callable, Dict, Any, Awaitable
 from aiogram import BaseMiddleware
 from aiogram.types import TelegramObject
 
-from bot.database import UserDatabase
+from bot.database import UserDatabase, run_db
 
 
 class UserDatabaseMiddleware(BaseMiddleware):
@@ -12,5 +12,8 @@ class UserDatabaseMiddleware(BaseMiddleware):
         event: TelegramObject,
         data: Dict[str, Any]
     ) -> Any:
-        UserDatabase(event.from_user.id, event.from_user.username).new_user()
-        return await handler(event, data)
\ No newline at end of file
+        # Пользователь в кэше - ни одного запроса к БД,
+        # смены username пишет bot.username_flusher
+        if not UserDatabase.touch_cached(event.from_user.id, event.from_user.username):
+            await run_db(lambda: UserDatabase(event.from_user.id, event.from_user.username).new_user())
+        return await handler(event, data)
@@ -7,6 +7,8 @@ from config.generator import TextGenerator
 
 ITEMS_PER_PAGE = 18
 ITEMS_COLUMN = 2
+HISTORY_PER_PAGE = 5
+FAVORITES_PER_PAGE = 10
 FLAG_PATH = ['flags']
 
 
@@ -154,10 +156,43 @@ def generate_service_buttons(services: List[Dict], page: int = 1) -> List[List[D
     return columnized_buttons
 
 
-def generate_activation_history_buttons(textgen: TextGenerator, history: List[SmsOrder]) -> List[Dict[str, str]]:
+def generate_keyset_navigation(
+        prefix: str, 
+        rows: List, 
+        has_prev: bool, 
+        has_next: bool
+    ) -> List[List[Dict[str, str]]]:
+    """Кнопки ⏪/⏩ для страниц keyset_page: курсор - id крайней строки страницы."""
+    navigation_buttons = []
+    if has_prev and rows:
+        navigation_buttons.append({
+            'text': '⏪',
+            'callback_data': f'{prefix}_prev_{rows[0].id}'
+        })
+    if has_next and rows:
+        navigation_buttons.append({
+            'text': '⏩',
+            'callback_data': f'{prefix}_next_{rows[-1].id}'
+        })
+    
+    return [navigation_buttons] if navigation_buttons else []
+
+
+def parse_keyset_navigation(callback_data: str) -> tuple:
+    """(cursor, backward) из callback_data кнопок generate_keyset_navigation"""
+    _, direction, cursor = callback_data.split('_')
+    return int(cursor), direction == 'prev'
+
+
+def generate_activation_history_buttons(
+        textgen: TextGenerator, 
+        history: List[SmsOrder], 
+        has_prev: bool = False, 
+        has_next: bool = False
+    ) -> List[Dict[str, str]]:
     buttons = []
 
-    for order in history[:5]:
+    for order in history:
         country_name = textgen.get(*FLAG_PATH, str(order.coutry_id), "name_ru")
 
         if order.status == 'completed':
@@ -172,18 +207,39 @@ def generate_activation_history_buttons(textgen: TextGenerator, history: List[Sm
             "callback_data": f"get-order-info_{order.order_id}"
         }])
     
+    buttons.extend(generate_keyset_navigation('history-page', history, has_prev, has_next))
     return buttons
 
 
 
-def generate_favorites_buttons(textgen: TextGenerator, favorites_list: List[Favorites]):
+def get_favorites_prices(sms_activate, fee: float, favorites_list: List[Favorites]) -> Dict[int, float]:
+    """Цены избранного с комиссией из индекса цен (без запросов к API): {favorite_id: price}"""
+    prices = {}
+
+    for favorite in favorites_list:
+        api_amount = sms_activate.get_cached_price(favorite.service, favorite.country_id)
+        if api_amount is not None:
+            prices[favorite.id] = CalculatorAsset.conver_price_with_fee(api_amount, fee)
+    
+    return prices
+
+
+def generate_favorites_buttons(
+        textgen: TextGenerator, 
+        favorites_list: List[Favorites], 
+        prices: Dict[int, float] | None = None,
+        has_prev: bool = False,
+        has_next: bool = False
+    ):
     buttons = []
+    prices = prices or {}
 
-    for order in favorites_list[:10]:
+    for order in favorites_list:
         country_name = textgen.get(*FLAG_PATH, str(order.country_id), "name_ru")
+        price = f" ({prices[order.id]}₽)" if order.id in prices else ''
 
         buttons.append([{
-            "text": f"{order.service_name} [{country_name}]",
+            "text": f"{order.service_name} [{country_name}]{price}",
             "callback_data": f"get-favorite_{order.id}"
         }])
     
@@ -193,6 +249,7 @@ def generate_favorites_buttons(textgen: TextGenerator, favorites_list: List[Favo
             "callback_data": "answer"
         }]]
     
+    buttons.extend(generate_keyset_navigation('favorites-page', favorites_list, has_prev, has_next))
     return buttons
 
 
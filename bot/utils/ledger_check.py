@@ -0,0 +1,54 @@
+import asyncio
+
+from structlog.typing import FilteringBoundLogger
+
+from bot.database import GlobalDatabase, LedgerDatabase, run_db
+from config.models import Config
+
+
+class LedgerChecker:
+    '''
+    Периодическая сверка балансов с журналом проводок (LedgerDatabase.fold).
+    Расхождение значит, что баланс изменили в обход LedgerDatabase.apply -
+    пишется в лог по каждому пользователю, балансы не исправляются.
+    '''
+
+    def __init__(self, config: Config, logger: FilteringBoundLogger) -> None:
+        self.logger = logger
+        self.interval = config.ledger_check_interval
+        self.mismatches = 0
+        self._task = None
+
+    def start(self) -> None:
+        if self.interval:
+            self._task = asyncio.create_task(self._checker())
+
+    async def _checker(self) -> None:
+        while not await run_db(GlobalDatabase.tables_is_created):
+            await asyncio.sleep(0.1)
+
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                self.logger.error(
+                    "❌ Ошибка сверки баланса",
+                    error=str(e)
+                )
+            await asyncio.sleep(self.interval)
+
+    async def check(self) -> int:
+        mismatches = await run_db(LedgerDatabase.fold)
+        for user_id, (balance_minor, ledger_minor) in mismatches.items():
+            self.logger.error(
+                f"❌ Баланс не сходится с журналом - {user_id}",
+                balance_minor=balance_minor,
+                ledger_minor=ledger_minor
+            )
+
+        self.mismatches = len(mismatches)
+        return self.mismatches
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from collections import deque
+from typing import Deque, Dict
+
+from structlog.typing import FilteringBoundLogger
+
+from config.models import Config
+
+
+class LoopLagMonitor:
+    '''
+    Задержка event loop: насколько позже запланированного просыпается
+    asyncio.sleep(interval). Любой блокирующий вызов (запрос к SQLite,
+    тяжёлый расчёт) в корутине виден здесь как лаг у всех пользователей.
+
+    Лаг больше warn_ms пишется в лог сразу, сводка - раз в report_interval секунд.
+    '''
+
+    def __init__(self, config: Config, logger: FilteringBoundLogger, interval: float = 0.1) -> None:
+        self.logger = logger
+        self.interval = interval
+        self.warn_ms = config.loop_lag_warn_ms
+        self.report_interval = config.loop_lag_report_interval
+
+        self.samples: Deque[float] = deque(maxlen=1000)
+        self.max_lag_ms = 0.0
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._monitor())
+
+    async def _monitor(self) -> None:
+        reported_at = time.monotonic()
+        while True:
+            started_at = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(time.monotonic() - started_at - self.interval, 0) * 1000
+
+            self.samples.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms > self.warn_ms:
+                self.logger.warning("Event loop lag", lag_ms=round(lag_ms, 1))
+
+            if self.report_interval and time.monotonic() - reported_at >= self.report_interval:
+                self.logger.debug("Event loop lag", **self.stats())
+                reported_at = time.monotonic()
+
+    def stats(self) -> Dict[str, float]:
+        samples = sorted(self.samples)
+        if not samples:
+            return {'p50_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+
+        return {
+            'p50_ms': round(samples[len(samples) // 2], 1),
+            'p99_ms': round(samples[min(len(samples) - 1, len(samples) * 99 // 100)], 1),
+            'max_ms': round(self.max_lag_ms, 1)
+        }
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
@@ -0,0 +1,162 @@
+import asyncio
+import itertools
+import json
+import time
+
+from typing import Dict, List, Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+from structlog.typing import FilteringBoundLogger
+
+from bot.api.resilience import backoff_delay
+from bot.database import GlobalDatabase, OutboxDatabase, Outbox, run_db
+from config.models import Config
+
+
+class OutboxDrainer:
+    '''
+    Доставка уведомлений из таблицы outbox.
+
+    Уведомление пишется в outbox в одной транзакции со сменой состояния
+    (заказ завершён, счёт оплачен), поэтому переживает рестарт бота и ошибки
+    Telegram. Drainer забирает готовые строки пачками (claim на claim_ttl
+    секунд - упавший процесс отпустит их сам), отправляет через bot.send_queue
+    и пачками же удаляет доставленные. Пока строки ждут в очереди (лимит на чат
+    может держать их дольше claim_ttl), claim продлевается каждые claim_ttl / 2
+    секунд, а SendQueue не ставит одну строку в очередь дважды.
+    Ошибки отправки - повтор с backoff, пользователь заблокировал бота /
+    неверный запрос - строка удаляется.
+    '''
+
+    def __init__(self, bot: Bot, config: Config, logger: FilteringBoundLogger, worker_id: str) -> None:
+        self.bot = bot
+        self.logger = logger
+        self.worker_id = worker_id
+        self.batch_size = config.outbox_batch_size
+        self.interval = config.outbox_interval
+        self.max_attempts = config.outbox_max_attempts
+        self.claim_ttl = config.outbox_claim_ttl
+
+        self._claims = itertools.count()
+        self._in_flight = 0
+        # claim -> сколько строк пачки ещё не отправлено
+        self._claims_in_flight: Dict[str, int] = {}
+        self._claims_extended_at = time.monotonic()
+        self._delivered: List[int] = []
+        self._failed: List[Tuple[Outbox, Exception]] = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+        self.stats = {
+            'delivered': 0,
+            'retried': 0,
+            'dropped': 0
+        }
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._drainer())
+
+    def notify(self) -> None:
+        '''Есть новые уведомления - не ждать следующего интервала'''
+        self._wakeup.set()
+
+    async def _drainer(self) -> None:
+        while not await run_db(GlobalDatabase.tables_is_created):
+            await asyncio.sleep(0.1)
+
+        while True:
+            claimed = 0
+            try:
+                await self._flush()
+                await self._extend_claims()
+                if self._in_flight < self.batch_size:
+                    claimed = await self._claim()
+            except Exception as e:
+                self.logger.error(
+                    "❌ Ошибка outbox drainer",
+                    error=str(e)
+                )
+
+            # Полная пачка - сразу берём следующую
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            else:
+                await asyncio.sleep(0)
+
+    async def _claim(self) -> int:
+        claim = f'{self.worker_id}:{next(self._claims)}'
+        rows = await run_db(OutboxDatabase.claim_batch, claim, self.batch_size, self.claim_ttl)
+        if rows:
+            self._claims_in_flight[claim] = len(rows)
+
+        for row in rows:
+            payload = json.loads(row.payload)
+            kwargs = payload['kwargs']
+            if payload['keyboard']:
+                kwargs['reply_markup'] = self.bot.textgen.generate_keyboard_markup(*payload['keyboard'])
+
+            future = self.bot.send_queue.send_message(
+                row.chat_id, text=payload['text'], priority=row.priority,
+                dedupe_key=('outbox', row.id), **kwargs
+            )
+            future.add_done_callback(lambda done, row=row: self._on_sent(row, done))
+            self._in_flight += 1
+        return len(rows)
+
+    def _on_sent(self, row: Outbox, future: asyncio.Future) -> None:
+        self._in_flight -= 1
+        self._claims_in_flight[row.claim] -= 1
+        if not self._claims_in_flight[row.claim]:
+            del self._claims_in_flight[row.claim]
+        if future.cancelled():
+            return
+        if future.exception() is None:
+            self._delivered.append(row.id)
+        else:
+            self._failed.append((row, future.exception()))
+        self._wakeup.set()
+
+    async def _extend_claims(self) -> None:
+        if time.monotonic() - self._claims_extended_at < self.claim_ttl / 2:
+            return
+
+        self._claims_extended_at = time.monotonic()
+        if self._claims_in_flight:
+            await run_db(OutboxDatabase.extend_claims, list(self._claims_in_flight), self.claim_ttl)
+
+    async def _flush(self) -> None:
+        '''Пачкой удаляем доставленные и откладываем неудачные'''
+        delivered, self._delivered = self._delivered, []
+        failed, self._failed = self._failed, []
+        self.stats['delivered'] += len(delivered)
+
+        retry: Dict[float, List[int]] = {}
+        for row, error in failed:
+            if isinstance(error, (TelegramForbiddenError, TelegramBadRequest)) or row.attempts + 1 >= self.max_attempts:
+                self.logger.warning(
+                    "Уведомление не доставлено",
+                    chat_id=row.chat_id,
+                    attempts=row.attempts + 1,
+                    error=str(error)
+                )
+                delivered.append(row.id)
+                self.stats['dropped'] += 1
+                continue
+
+            retry.setdefault(round(1 + backoff_delay(row.attempts, 2, cap=300)), []).append(row.id)
+            self.stats['retried'] += 1
+
+        if delivered:
+            await run_db(OutboxDatabase.delete_delivered, delivered)
+        for delay, ids in retry.items():
+            await run_db(OutboxDatabase.retry_later, ids, delay)
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+        await self._flush()
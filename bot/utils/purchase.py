@@ -0,0 +1,61 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from structlog.typing import FilteringBoundLogger
+
+from bot.database import db, LedgerDatabase, run_db
+
+
+INSUFFICIENT_FUNDS = 'insufficient_funds'
+NOT_AVAILABLE = 'not_available'
+
+
+async def purchase(
+        user_id: int,
+        amount_minor: int,
+        acquire: Callable[[], Awaitable[Optional[Dict[str, Any]]]],
+        record: Callable[[Dict[str, Any]], Any],
+        cancel: Callable[[Dict[str, Any]], Awaitable[Any]],
+        logger: FilteringBoundLogger
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    '''
+    Покупка у провайдера через резерв средств:
+
+    1. hold - параллельные нажатия не пройдут вдвоём;
+    2. acquire() - запрос номера, при ошибке или пустом ответе резерв возвращается;
+    3. capture (ref = id номера) и record(ответ) одной транзакцией;
+    4. если резерв просрочен и средства уже потрачены - резерв возвращается,
+       номер отменяется у провайдера через cancel(ответ).
+
+    Возвращает (ответ провайдера, None) или (None, INSUFFICIENT_FUNDS / NOT_AVAILABLE).
+    '''
+    if not await run_db(LedgerDatabase.hold, user_id, amount_minor):
+        return None, INSUFFICIENT_FUNDS
+
+    try:
+        response = await acquire()
+    except Exception:
+        await run_db(LedgerDatabase.release, user_id, amount_minor)
+        raise
+
+    if not response:
+        await run_db(LedgerDatabase.release, user_id, amount_minor)
+        return None, NOT_AVAILABLE
+
+    def capture() -> bool:
+        with db.atomic():
+            if not LedgerDatabase.capture(user_id, amount_minor, ref=response.get('id')):
+                return False
+
+            record(response)
+            return True
+
+    if not await run_db(capture):
+        await run_db(LedgerDatabase.release, user_id, amount_minor)
+        if not await cancel(response):
+            logger.error(
+                f"❌ Резерв просрочен, номер не отменён у провайдера - {response.get('id')}",
+                user_id=user_id
+            )
+        return None, INSUFFICIENT_FUNDS
+
+    return response, None
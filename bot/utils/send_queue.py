@@ -0,0 +1,154 @@
+import asyncio
+import itertools
+import time
+
+from typing import Any, Dict, Hashable, Optional, Tuple, Union
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from structlog.typing import FilteringBoundLogger
+
+from bot.api.ratelimit import TokenBucket
+from config.models import Config
+
+
+# Очереди по приоритету: коды и оплаты уходят раньше информационных сообщений
+PRIORITIES = {
+    'high': 0,
+    'normal': 1,
+    'low': 2
+}
+
+
+class SendQueue:
+    '''
+    Очередь исходящих сообщений Telegram.
+
+    Продюсеры (puller'ы, handler'ы) кладут сообщение через send_message/enqueue
+    и не ждут Telegram. Воркеры отправляют по приоритету с глобальным лимитом
+    (token bucket, ~30 сообщений/с) и лимитом на чат (~1 сообщение/с):
+    сообщение в "занятый" чат откладывается и не блокирует остальные.
+    TelegramRetryAfter откладывает только этот чат на retry_after секунд.
+    '''
+
+    def __init__(self, bot: Bot, config: Config, logger: FilteringBoundLogger) -> None:
+        self.bot = bot
+        self.logger = logger
+        self.workers = config.telegram_send_workers
+        self.chat_interval = 1 / config.telegram_chat_rps if config.telegram_chat_rps > 0 else 0
+        self.rate_limiter = TokenBucket('telegram', config.telegram_global_rps)
+
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._sequence = itertools.count()
+        # Когда в чат можно отправить следующее сообщение
+        self._chat_ready_at: Dict[int, float] = {}
+        # dedupe_key -> future сообщения, которое ещё в очереди
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+        self._tasks = []
+
+        self.sent = 0
+        self.deferred = 0
+        self.retry_after = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def send_message(
+            self,
+            chat_id: int,
+            text: str,
+            priority: str = 'normal',
+            dedupe_key: Optional[Hashable] = None,
+            **kwargs
+        ) -> asyncio.Future:
+        return self.enqueue('send_message', chat_id, priority, dedupe_key, text=text, **kwargs)
+
+    def enqueue(
+            self,
+            method: str,
+            chat_id: int,
+            priority: str = 'normal',
+            dedupe_key: Optional[Hashable] = None,
+            **kwargs
+        ) -> asyncio.Future:
+        '''
+        Ставит вызов bot.<method>(chat_id, **kwargs) в очередь.
+        Возвращает future с результатом - ждать его не обязательно.
+        Вызов с dedupe_key, который ещё в очереди, возвращает future первого.
+        '''
+        if dedupe_key is not None and dedupe_key in self._pending:
+            return self._pending[dedupe_key]
+
+        future = asyncio.get_running_loop().create_future()
+        # Ошибку отправки никто может не забрать - не засоряем лог asyncio
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        if dedupe_key is not None:
+            self._pending[dedupe_key] = future
+            future.add_done_callback(lambda _: self._pending.pop(dedupe_key, None))
+
+        self._queue.put_nowait((PRIORITIES[priority], next(self._sequence), chat_id, method, kwargs, future))
+        return future
+
+    def _defer(self, item: Tuple, delay: float) -> None:
+        self.deferred += 1
+        asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, item)
+
+    async def _worker(self) -> None:
+        while True:
+            item = await self._queue.get()
+            _, _, chat_id, method, kwargs, future = item
+
+            now = time.monotonic()
+            ready_at = self._chat_ready_at.get(chat_id, 0)
+            if ready_at > now:
+                self._defer(item, ready_at - now)
+                continue
+            self._chat_ready_at[chat_id] = now + self.chat_interval
+
+            await self.rate_limiter.acquire()
+            try:
+                result = await getattr(self.bot, method)(chat_id, **kwargs)
+            except TelegramRetryAfter as e:
+                self.retry_after += 1
+                self._chat_ready_at[chat_id] = time.monotonic() + e.retry_after
+                self._defer(item, e.retry_after)
+                self.logger.warning(
+                    "Telegram flood control",
+                    chat_id=chat_id,
+                    retry_after=e.retry_after
+                )
+                continue
+            except Exception as e:
+                self.failed += 1
+                if not future.done():
+                    future.set_exception(e)
+                continue
+
+            self.sent += 1
+            if not future.done():
+                future.set_result(result)
+
+            if len(self._chat_ready_at) > 10000:
+                self._prune_chats()
+
+    def _prune_chats(self) -> None:
+        now = time.monotonic()
+        self._chat_ready_at = {
+            chat_id: ready_at for chat_id, ready_at in self._chat_ready_at.items()
+            if ready_at > now
+        }
+
+    def stats(self) -> Dict[str, Union[int, Any]]:
+        return {
+            'queued': self._queue.qsize(),
+            'sent': self.sent,
+            'deferred': self.deferred,
+            'retry_after': self.retry_after,
+            'failed': self.failed,
+            'rate_limiter': self.rate_limiter.stats()
+        }
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
@@ -0,0 +1,41 @@
+import asyncio
+
+from structlog.typing import FilteringBoundLogger
+
+from bot.database import UserDatabase, run_db
+from config.models import Config
+
+
+class UsernameFlusher:
+    '''
+    Смены username копятся в кэше пользователей (UserDatabaseMiddleware)
+    и пишутся в БД пачкой раз в interval секунд. Остаток при остановке
+    записывает main.py после close().
+    '''
+
+    def __init__(self, config: Config, logger: FilteringBoundLogger) -> None:
+        self.logger = logger
+        self.interval = config.user_cache_flush_interval
+        self._task = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._flusher())
+
+    async def _flusher(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self) -> int:
+        try:
+            return await run_db(UserDatabase.flush_usernames)
+        except Exception as e:
+            self.logger.error(
+                "❌ Ошибка записи username",
+                error=str(e)
+            )
+            return 0
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, field_validator, computed_field
+from pydantic import BaseModel, field_validator, model_validator, computed_field
 from typing import Union, List, Dict
 
 
@@ -21,6 +21,62 @@ class Config(BaseModel):
     support_username: str 
     support_redirect_channel: str
     payment_timeout_minutes: int
+    services_cache_ttl: int = 600 # in seconds
+    services_cache_stale_ttl: int = 3600 # in seconds
+    countries_cache_ttl: int = 60 # in seconds
+    countries_cache_stale_ttl: int = 60 # in seconds
+    countries_cache_size: int = 256 # max cached services
+    price_index_interval: int = 300 # in seconds, full getPrices refresh, 0 - disabled
+    sms_poll_min_interval: int = 3 # in seconds, fresh activations
+    sms_poll_max_interval: int = 30 # in seconds, old activations
+    rent_poll_max_interval: int = 300 # in seconds, rentals without new sms
+    sms_poll_concurrency: int = 20 # parallel status requests per cycle
+    sms_bulk_status_sync: bool = True # use getActiveActivations instead of getStatus per order
+    sms_webhook_enabled: bool = False
+    sms_webhook_host: str = '0.0.0.0'
+    sms_webhook_port: int = 8080
+    sms_webhook_path: str = '/sms-activate/webhook'
+    sms_webhook_secret: str | None = None # expected ?secret= in webhook url, required when enabled
+    sms_webhook_reconcile_interval: int = 60 # in seconds, polling fallback when webhook enabled
+    sms_activate_base_url: str = 'https://api.sms-activate.guru/'
+    sms_activate_timeout: float = 10 # in seconds, default for every action
+    sms_activate_action_timeouts: Dict[str, float] = {} # action:seconds,action:seconds
+    sms_activate_retries: int = 2 # extra attempts, idempotent actions only
+    sms_activate_retry_backoff: float = 0.5 # in seconds, base of jittered exponential backoff
+    sms_activate_breaker_threshold: int = 5 # failures in a row to open the breaker
+    sms_activate_breaker_reset: int = 30 # in seconds, before a probe request
+    sms_activate_rps: float = 10 # requests per second, user-facing, 0 - unlimited
+    sms_activate_background_rps: float = 5 # requests per second, backend puller
+    crypto_bot_rps: float = 5
+    crypto_bot_background_rps: float = 2
+    http_max_connections: int = 50 # per api host, user-facing requests
+    http_background_max_connections: int = 20 # per api host, backend pullers
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30 # in seconds
+    http2_enabled: bool = False # requires httpx[http2]
+    telegram_global_rps: float = 30 # messages per second, bot-wide Telegram limit
+    telegram_chat_rps: float = 1 # messages per second to one chat
+    telegram_send_workers: int = 4
+    outbox_batch_size: int = 500 # notifications claimed per database round trip
+    outbox_interval: float = 1 # in seconds, idle poll of the outbox table
+    outbox_max_attempts: int = 10
+    outbox_claim_ttl: int = 300 # in seconds, then undelivered rows are retried by any process
+    loop_lag_warn_ms: float = 100 # log event loop stalls longer than this
+    loop_lag_report_interval: int = 300 # in seconds, 0 - no periodic summary
+    sqlite_journal_mode: str = 'wal' # wal, delete, truncate
+    sqlite_synchronous: str = 'normal' # full, normal, off
+    sqlite_cache_size: int = -64000 # pages, negative - KiB (64 MB)
+    sqlite_mmap_size: int = 268435456 # in bytes, 0 - disabled
+    sqlite_temp_store: str = 'memory' # default, file, memory
+    sqlite_busy_timeout: int = 5000 # in ms, wait for a lock instead of "database is locked"
+    user_cache_size: int = 10000 # users kept in memory, 0 - disabled
+    user_cache_ttl: float = 60 # in seconds, balances changed by other processes
+    user_cache_flush_interval: float = 5 # in seconds, batched username updates
+    ledger_check_interval: int = 3600 # in seconds, balances vs ledger, 0 - disabled
+    balance_hold_ttl: int = 600 # in seconds, funds reserved by a crashed process are freed
+    worker_id: str | None = None # unique per bot process, default host:pid
+    worker_heartbeat_interval: int = 5 # in seconds
+    worker_lease_ttl: int = 20 # in seconds, orders of a silent worker move to others
     
 
     @field_validator('admin_id', mode='before')
@@ -45,6 +101,43 @@ class Config(BaseModel):
             "stars": int(value_list[0]), "rub": int(value_list[1])
         }
 
+    @model_validator(mode='after')
+    def validate_sms_webhook_secret(self) -> 'Config':
+        # Без секрета любой может прислать на webhook поддельный код
+        if self.sms_webhook_enabled and not (self.sms_webhook_secret or '').strip():
+            raise ValueError('SMS_WEBHOOK_SECRET обязателен при SMS_WEBHOOK_ENABLED=true')
+        return self
+
+    @model_validator(mode='after')
+    def validate_outbox_claim_ttl(self) -> 'Config':
+        # Drainer продлевает claim раз в claim_ttl / 2 на своём цикле (не реже outbox_interval),
+        # иначе строка, ждущая в SendQueue, истечёт и будет отправлена повторно
+        if self.outbox_claim_ttl <= 2 * self.outbox_interval:
+            raise ValueError('OUTBOX_CLAIM_TTL должен быть больше 2 * OUTBOX_INTERVAL')
+        return self
+
+    @field_validator('worker_id', mode='before')
+    @classmethod
+    def validate_worker_id(cls, value: str | None) -> str | None:
+        # Пустое значение (или комментарий, прочитанный dotenv как значение) - host:pid
+        if value is None or not value.strip() or value.strip().startswith('#'):
+            return None
+        return value.strip()
+
+    @field_validator('sms_activate_action_timeouts', mode='before')
+    @classmethod
+    def validate_action_timeouts(cls, value: str | Dict[str, float]) -> Dict[str, float]:
+        if not isinstance(value, str):
+            return value
+
+        timeouts = {}
+        for item in filter(None, value.replace(' ', '').split(',')):
+            if ':' not in item:
+                raise ValueError('Таймауты должны быть в формате action:seconds через запятую, например getNumber:20,getStatus:5')
+            action, seconds = item.split(':', 1)
+            timeouts[action] = float(seconds)
+        return timeouts
+
     @computed_field
     def check_admin_exist(self, admin_id: int) -> bool:
         return admin_id in self.admin_id
@@ -15,13 +15,20 @@ from aiogram.client.default import DefaultBotProperties
 from config.generator import TextGenerator
 
 from bot.handlers import get_all_routers
-from bot.database import GlobalDatabase
-from bot.api import SMSActivateAPI, CryptoBotAPI, check_all_payments_system
+from bot.database import GlobalDatabase, LedgerDatabase, UserDatabase, run_db
+from bot.database.migrations import run_migrations
+from bot.database.cache import user_cache
+from bot.utils.send_queue import SendQueue
+from bot.utils.outbox import OutboxDrainer
+from bot.utils.loop_lag import LoopLagMonitor
+from bot.utils.ledger_check import LedgerChecker
+from bot.utils.username_flusher import UsernameFlusher
+from bot.api import SMSActivateAPI, SmsActivateWebhook, CryptoBotAPI, WorkerShard, check_all_payments_system
 
 
 async def default_info(bot: Bot):
     me = await bot.get_me()
-    database_init = GlobalDatabase.create_tables()
+    database_init = await run_db(GlobalDatabase.create_tables)
     bot.bot_username = me.username
 
     bot.logger.info(f'⚙️ [v{bot.config.version}] created by t.me/awixa')
@@ -31,6 +38,14 @@ async def default_info(bot: Bot):
         bot.logger.debug('Use actual database')
     else:
         bot.logger.debug('Created new tables', tables=database_init)
+    bot.logger.info('✅ DATABASE: SQLite', **await run_db(GlobalDatabase.get_pragmas))
+
+    # Puller'ы ждут окончания миграций (GlobalDatabase.tables_is_created)
+    applied_migrations = await run_db(run_migrations, database_init)
+    if applied_migrations:
+        bot.logger.info('Applied migrations', migrations=applied_migrations)
+    for query, plan in (await run_db(GlobalDatabase.check_query_plans)).items():
+        bot.logger.warning(f'❌ DATABASE: full table scan - {query}', plan=plan)
     
     if await check_all_payments_system(
         bot.logger, bot.config, bot.sms_activate, bot.crypto_bot
@@ -40,11 +55,16 @@ async def default_info(bot: Bot):
         await bot.session.close() 
         sys.exit(1)
 
+    await bot.worker_shard.start()
+
 
 async def main():
     locale.setlocale(locale.LC_TIME, "ru_RU.UTF-8") # for russia datetime 
 
     _config = config.load_config()
+    GlobalDatabase.configure(_config)
+    user_cache.configure(_config.user_cache_size, _config.user_cache_ttl)
+    LedgerDatabase.hold_ttl = _config.balance_hold_ttl
     logger = structlog.get_logger()
     dp = Dispatcher()
     bot = Bot(token=_config.bot_token, default=DefaultBotProperties(
@@ -52,15 +72,42 @@ async def main():
     ))
 
     bot.textgen = TextGenerator(_config.messages_path)
-    bot.sms_activate = SMSActivateAPI(_config.sms_activate_api_token, logger, bot)
-    bot.crypto_bot = CryptoBotAPI(bot, _config, logger)
+    bot.worker_shard = WorkerShard(_config, logger)
+    bot.sms_activate = SMSActivateAPI(_config.sms_activate_api_token, logger, bot, _config, bot.worker_shard)
+    bot.crypto_bot = CryptoBotAPI(bot, _config, logger, shard=bot.worker_shard)
     bot.logger = logger
     bot.config = _config
+    bot.send_queue = SendQueue(bot, _config, logger)
+    bot.send_queue.start()
+    bot.outbox = OutboxDrainer(bot, _config, logger, bot.worker_shard.worker_id)
+    bot.outbox.start()
+    bot.loop_lag = LoopLagMonitor(_config, logger)
+    bot.loop_lag.start()
+    bot.ledger_check = LedgerChecker(_config, logger)
+    bot.ledger_check.start()
+    bot.username_flusher = UsernameFlusher(_config, logger)
+    bot.username_flusher.start()
     
     await default_info(bot)
 
+    bot.sms_webhook = None
+    if _config.sms_webhook_enabled:
+        bot.sms_webhook = SmsActivateWebhook(bot.sms_activate, _config, logger)
+        await bot.sms_webhook.start()
+
     dp.include_routers(*get_all_routers(logger))
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if bot.sms_webhook:
+            await bot.sms_webhook.close()
+        await bot.loop_lag.close()
+        await bot.ledger_check.close()
+        await bot.username_flusher.close()
+        await run_db(UserDatabase.flush_usernames)
+        await bot.outbox.close()
+        await bot.send_queue.close()
+        await bot.worker_shard.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,14 @@
+-- Схема базы до версионных миграций: на ней проверяется, что run_migrations
+-- приводит существующую базу к тем же индексам, что и create_tables
+CREATE TABLE "user" ("id" INTEGER NOT NULL PRIMARY KEY, "username" TEXT, "balance" REAL NOT NULL, "ref_balance" INTEGER NOT NULL);
+CREATE TABLE "referal" ("id" INTEGER NOT NULL PRIMARY KEY, "from_user" INTEGER NOT NULL, "to_user" INTEGER NOT NULL);
+CREATE TABLE "invoices" ("id" INTEGER NOT NULL PRIMARY KEY, "invoice_id" TEXT NOT NULL, "user_id" INTEGER NOT NULL, "payment_provider" TEXT NOT NULL, "create_time" DATETIME NOT NULL, "status" TEXT NOT NULL, "payment_message_id" INTEGER NOT NULL);
+CREATE TABLE "smsorder" ("id" INTEGER NOT NULL PRIMARY KEY, "order_id" TEXT NOT NULL, "user_id" INTEGER NOT NULL, "phone" TEXT NOT NULL, "service" TEXT NOT NULL, "service_name" TEXT NOT NULL, "coutry_id" INTEGER NOT NULL, "price" REAL NOT NULL, "create_time" DATETIME NOT NULL, "status" TEXT NOT NULL);
+CREATE TABLE "favorites" ("id" INTEGER NOT NULL PRIMARY KEY, "user_id" INTEGER NOT NULL, "service" TEXT NOT NULL, "service_name" TEXT NOT NULL, "country_id" INTEGER NOT NULL, "create_time" DATETIME NOT NULL);
+CREATE TABLE "rentnumber" ("id" INTEGER NOT NULL PRIMARY KEY, "order_id" INTEGER NOT NULL, "user_id" INTEGER NOT NULL, "phone" TEXT NOT NULL, "start_date" DATETIME NOT NULL, "end_date" DATETIME NOT NULL, "price" REAL NOT NULL, "status" TEXT NOT NULL);
+CREATE TABLE "promouse" ("id" INTEGER NOT NULL PRIMARY KEY, "promo_id" INTEGER NOT NULL, "user_id" INTEGER NOT NULL);
+CREATE TABLE "promo" ("id" INTEGER NOT NULL PRIMARY KEY, "code" TEXT NOT NULL, "activates" INTEGER NOT NULL, "amount" INTEGER NOT NULL);
+
+INSERT INTO "user" ("id", "username", "balance", "ref_balance") VALUES (1, 'user', 150.5, 0);
+INSERT INTO "smsorder" ("order_id", "user_id", "phone", "service", "service_name", "coutry_id", "price", "create_time", "status")
+VALUES ('100', 1, '79990000000', 'tg', 'Telegram', 0, 10, '2025-01-01 00:00:00', 'completed');
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot.database import db, db_executor, GlobalDatabase
+from bot.database.migrations import run_migrations
+from config.models import Config
+
+
+@pytest.fixture
+def make_config():
+    def factory(**overrides) -> Config:
+        values = dict(
+            version='test',
+            bot_token='123:test',
+            admin_id='1',
+            service_fee=0.05,
+            service_name='test',
+            referal_fee=0.1,
+            messages_path='config/messages/default.yaml',
+            messages_parse_mode='HTML',
+            sms_activate_api_token='sms-activate-token',
+            crypto_bot_api_token='crypto-bot-token',
+            cryptobot_usdt_rub_rate=90,
+            tg_stars_max=100,
+            tg_stars_star_rub_rate='100:215',
+            success_payment_reaction_id=None,
+            support_username='support',
+            support_redirect_channel='channel',
+            payment_timeout_minutes=10
+        )
+        values.update(overrides)
+        return Config(**values)
+    return factory
+
+
+BASELINE_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_schema.sql')
+
+
+def open_database(path: str, schema: str = None):
+    '''База по пути path: schema (SQL), затем таблицы и миграции как при запуске бота'''
+    db.init(path)
+    if schema:
+        with open(schema, encoding='utf-8') as file:
+            db.connection().executescript(file.read())
+    run_migrations(GlobalDatabase.create_tables())
+    return db
+
+
+def close_database():
+    # run_db держит своё соединение в потоке БД - иначе следующий тест читает эту базу
+    db_executor.submit(db.close).result()
+    db.close()
+
+
+@pytest.fixture
+def database(tmp_path):
+    '''Новая база во временной папке'''
+    yield open_database(str(tmp_path / 'database.sqlite'))
+    close_database()
+
+
+@pytest.fixture
+def baseline_database(tmp_path):
+    '''Существующая база со схемой до миграций (tests/baseline_schema.sql), обновлённая run_migrations'''
+    yield open_database(str(tmp_path / 'database.sqlite'), BASELINE_SCHEMA)
+    close_database()
@@ -0,0 +1,32 @@
+import asyncio
+
+import structlog
+
+from bot.api.cache import AsyncTTLCache
+
+
+def test_empty_reload_keeps_expired_entry():
+    cache = AsyncTTLCache('test', ttl=0, stale_ttl=0, logger=structlog.get_logger())
+
+    async def scenario():
+        async def loaded():
+            return {'tg': 'Telegram'}
+
+        async def upstream_error():
+            return {}
+
+        await cache.get_or_load('ru', loaded)
+        return await cache.get_or_load('ru', upstream_error)
+
+    assert asyncio.run(scenario()) == {'tg': 'Telegram'}
+    assert cache.stale_on_error == 1
+
+
+def test_empty_first_load_is_not_cached():
+    cache = AsyncTTLCache('test', ttl=60, stale_ttl=0, logger=structlog.get_logger())
+
+    async def upstream_error():
+        return {}
+
+    assert asyncio.run(cache.get_or_load('ru', upstream_error)) == {}
+    assert cache.stats()['size'] == 0
@@ -0,0 +1,15 @@
+import io
+
+import pytest
+
+from dotenv import dotenv_values
+
+
+@pytest.mark.parametrize('line', ['WORKER_ID=', 'WORKER_ID= # comment', 'WORKER_ID=   '])
+def test_blank_worker_id_falls_back_to_host_pid(make_config, line):
+    env = dotenv_values(stream=io.StringIO(line))
+    assert make_config(worker_id=env['WORKER_ID']).worker_id is None
+
+
+def test_worker_id_is_kept(make_config):
+    assert make_config(worker_id=' bot-1 ').worker_id == 'bot-1'
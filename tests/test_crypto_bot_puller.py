@@ -0,0 +1,52 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import structlog
+
+from bot.api.payments.crypto_bot import CryptoBotAPI
+from bot.database import InvoicesDatabase, User
+
+
+def test_failed_get_invoices_does_not_stop_puller(database, make_config):
+    User.create(id=1)
+    InvoicesDatabase(1).create_new_invoice('500', 'crypto_bot', 10)
+
+    config = make_config()
+    sent = []
+    bot = SimpleNamespace(
+        config=config,
+        textgen=SimpleNamespace(get=lambda *keys, **kwargs: 'paid'),
+        outbox=SimpleNamespace(notify=lambda: None),
+        send_queue=SimpleNamespace(enqueue=lambda *args, **kwargs: sent.append(args))
+    )
+
+    async def scenario():
+        api = CryptoBotAPI(bot, config, structlog.get_logger(), backend_puller_autostart=False)
+        api.timeout_cryptobot_updates = 0
+        calls = []
+
+        async def request(api_method, params=None, coalesce=False, background=False):
+            calls.append(api_method)
+            if len(calls) == 1:
+                raise httpx.ReadTimeout('timeout')
+            return httpx.Response(200, json={'ok': True, 'result': {'items': [
+                {'invoice_id': 500, 'status': 'paid', 'amount': '1'}
+            ]}})
+        api._request = request
+
+        api._running = True
+        puller = asyncio.create_task(api._backend_puller())
+        for _ in range(100):
+            if sent:
+                break
+            await asyncio.sleep(0.01)
+
+        await api.close()
+        await puller
+        return calls
+
+    calls = asyncio.run(scenario())
+    assert len(calls) >= 2
+    assert sent == [('delete_message', 1, 'low')]
+    assert User.get_by_id(1).balance_minor > 0
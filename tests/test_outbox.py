@@ -0,0 +1,53 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import structlog
+from pydantic import ValidationError
+
+from bot.database import Outbox, OutboxDatabase, run_db
+from bot.utils.outbox import OutboxDrainer
+from bot.utils.send_queue import SendQueue
+
+
+def test_queued_row_is_not_claimed_again_after_claim_ttl(database, make_config):
+    config = make_config(outbox_claim_ttl=1, outbox_interval=0.1)
+    OutboxDatabase.add(1, 'code')
+
+    async def scenario():
+        # Очередь без воркеров: сообщение ждёт дольше claim_ttl, как при лимите на чат
+        send_queue = SendQueue(None, config, structlog.get_logger())
+        drainer = OutboxDrainer(
+            SimpleNamespace(send_queue=send_queue), config, structlog.get_logger(), 'worker'
+        )
+        drainer.start()
+        await asyncio.sleep(1.6)
+
+        reclaimed = await run_db(OutboxDatabase.claim_batch, 'other', 10, 1)
+        queued = send_queue._queue.qsize()
+
+        for future in list(send_queue._pending.values()):
+            future.set_result(True)
+        await asyncio.sleep(0.3)
+        await drainer.close()
+        return reclaimed, queued
+
+    reclaimed, queued = asyncio.run(scenario())
+    assert reclaimed == []
+    assert queued == 1
+    assert Outbox.select().count() == 0
+
+
+def test_send_queue_dedupes_by_key(make_config):
+    async def scenario():
+        send_queue = SendQueue(None, make_config(), structlog.get_logger())
+        first = send_queue.send_message(1, 'code', dedupe_key=('outbox', 7))
+        second = send_queue.send_message(1, 'code', dedupe_key=('outbox', 7))
+        return first is second, send_queue._queue.qsize()
+
+    assert asyncio.run(scenario()) == (True, 1)
+
+
+def test_claim_ttl_must_outlast_renewal(make_config):
+    with pytest.raises(ValidationError):
+        make_config(outbox_claim_ttl=2, outbox_interval=1)
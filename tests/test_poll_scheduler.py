@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+import structlog
+
+from bot.api.resilience import CircuitOpenError
+from bot.api.sms_client.scheduler import PollScheduler
+from bot.api.sms_client.sms_activate import SMSActivateAPI
+from bot.database import SmsOrdersDatabase, User
+
+
+def test_pop_due_keys_return_on_next_sync():
+    scheduler = PollScheduler()
+    scheduler.sync(['a', 'b'], now=0)
+
+    assert sorted(scheduler.pop_due(now=0)) == ['a', 'b']
+    assert scheduler.next_due() is None
+
+    # Вызывающий код не перепланировал ключи - sync возвращает их сразу
+    scheduler.sync(['a', 'b'], now=10)
+    assert sorted(scheduler.pop_due(now=10)) == ['a', 'b']
+
+
+def test_failed_cycle_keeps_orders_scheduled(database, make_config):
+    User.create(id=1)
+    SmsOrdersDatabase(1).create_order('100', '79990000000', 'tg', 'Telegram', 0, 10)
+
+    async def scenario():
+        api = SMSActivateAPI(
+            'sms-activate-token', structlog.get_logger(), None,
+            make_config(price_index_interval=0, sms_poll_min_interval=1)
+        )
+        api._running = False
+
+        async def breaker_open(active_orders):
+            raise CircuitOpenError('SmsActivate')
+        api._sync_active_orders = breaker_open
+
+        try:
+            await api._poll_cycle()
+        except CircuitOpenError:
+            pass
+
+        next_due = api.poll_scheduler.next_due()
+        await api.close()
+        return next_due
+
+    next_due = asyncio.run(scenario())
+    assert next_due is not None
+    assert next_due <= time.monotonic() + 1
+
+
+def test_bulk_sync_failure_falls_back_to_get_status(database, make_config):
+    User.create(id=1)
+    order = SmsOrdersDatabase(1).create_order('100', '79990000000', 'tg', 'Telegram', 0, 10)
+
+    async def scenario():
+        api = SMSActivateAPI(
+            'sms-activate-token', structlog.get_logger(), None,
+            make_config(price_index_interval=0)
+        )
+        api._running = False
+
+        async def breaker_open(background=False):
+            raise CircuitOpenError('SmsActivate')
+        api.get_active_activations = breaker_open
+
+        missing = await api._sync_active_orders([order])
+        await api.close()
+        return missing
+
+    assert asyncio.run(scenario()) == [order]
@@ -0,0 +1,59 @@
+import asyncio
+
+import structlog
+
+from bot.database import LedgerEntry, User, run_db
+from bot.utils.purchase import purchase, INSUFFICIENT_FUNDS, NOT_AVAILABLE
+
+
+def run_purchase(acquire, recorded, cancelled):
+    async def cancel(number):
+        cancelled.append(number['id'])
+        return True
+
+    return asyncio.run(purchase(
+        1, 1000,
+        acquire=acquire,
+        record=lambda number: recorded.append(number['id']),
+        cancel=cancel,
+        logger=structlog.get_logger()
+    ))
+
+
+def test_purchase_captures_and_records(database):
+    User.create(id=1, balance_minor=1500)
+    recorded, cancelled = [], []
+
+    async def acquire():
+        return {'id': '100'}
+
+    assert run_purchase(acquire, recorded, cancelled) == ({'id': '100'}, None)
+    assert recorded == ['100'] and cancelled == []
+
+    user = User.get_by_id(1)
+    assert (user.balance_minor, user.held_minor) == (500, 0)
+    assert LedgerEntry.get(LedgerEntry.user_id == 1).ref == '100'
+
+
+def test_purchase_releases_hold_when_number_not_available(database):
+    User.create(id=1, balance_minor=1500)
+
+    async def acquire():
+        return None
+
+    assert run_purchase(acquire, [], []) == (None, NOT_AVAILABLE)
+    assert User.get_by_id(1).held_minor == 0
+
+
+def test_failed_capture_releases_hold_and_cancels_upstream(database):
+    User.create(id=1, balance_minor=1500)
+    recorded, cancelled = [], []
+
+    async def acquire():
+        # Резерв просрочен и средства потрачены, пока ждали провайдера
+        await run_db(lambda: User.update(balance_minor=0).where(User.id == 1).execute())
+        return {'id': '100'}
+
+    assert run_purchase(acquire, recorded, cancelled) == (None, INSUFFICIENT_FUNDS)
+    assert recorded == [] and cancelled == ['100']
+    assert User.get_by_id(1).held_minor == 0
@@ -0,0 +1,12 @@
+from bot.database import GlobalDatabase, User
+
+
+def test_hot_queries_use_indexes(database):
+    # Новый запрос или миграция без индекса - полное сканирование таблицы
+    assert GlobalDatabase.check_query_plans() == {}
+
+
+def test_hot_queries_use_indexes_after_migrating_baseline(baseline_database):
+    # В проде индексы приходят из миграций поверх существующей базы, а не из create_tables
+    assert GlobalDatabase.check_query_plans() == {}
+    assert User.get_by_id(1).balance_minor == 15050
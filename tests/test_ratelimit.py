@@ -0,0 +1,36 @@
+import asyncio
+
+import structlog
+
+from bot.api.ratelimit import RequestGate
+
+
+def test_request_gate_coalesces_identical_requests():
+    gate = RequestGate('test', rps=0, background_rps=0, logger=structlog.get_logger())
+    sent = []
+
+    async def send():
+        sent.append(1)
+        await asyncio.sleep(0.01)
+        return 'response'
+
+    async def scenario():
+        return await asyncio.gather(
+            gate.request('getPrices', {'service': 'tg', 'country': 0}, send, coalesce=True),
+            gate.request('getPrices', {'country': '0', 'service': 'tg'}, send, coalesce=True),
+            gate.request('getPrices', {'service': 'wa', 'country': 0}, send, coalesce=True),
+            gate.request('getPrices', {'service': 'tg', 'country': 0}, send)
+        )
+
+    assert asyncio.run(scenario()) == ['response'] * 4
+    assert len(sent) == 3
+
+
+def test_request_gate_background_budget_is_separate():
+    gate = RequestGate('test', rps=0.01, background_rps=0, logger=structlog.get_logger())
+    gate.rate_limiter.tokens = 0
+
+    async def scenario():
+        return await asyncio.wait_for(gate.wait(background=True), timeout=1)
+
+    assert asyncio.run(scenario()) == 0.0
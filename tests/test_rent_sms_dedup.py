@@ -0,0 +1,41 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import structlog
+
+from bot.api.sms_client.sms_activate import SMSActivateAPI
+from bot.api.sms_client.webhook import SmsActivateWebhook
+from bot.database import Outbox, RentDatabase, User
+
+
+def test_rent_sms_from_webhook_and_poll_is_delivered_once(database, make_config):
+    User.create(id=1)
+    rent_id = RentDatabase(1).create_rent_order(700, '79990000000', datetime.now() + timedelta(hours=4), 10)
+    config = make_config(price_index_interval=0, sms_webhook_enabled=True, sms_webhook_secret='s3cret')
+
+    async def scenario():
+        bot = SimpleNamespace(
+            textgen=SimpleNamespace(get=lambda *keys, **kwargs: 'sms'),
+            outbox=SimpleNamespace(notify=lambda: None)
+        )
+        api = SMSActivateAPI('sms-activate-token', structlog.get_logger(), bot, config)
+        api._running = False
+        webhook = SmsActivateWebhook(api, config, structlog.get_logger())
+
+        # Webhook без receivedAt, опрос - с датой и другим форматированием
+        await webhook._process_rent({
+            'rentId': 700, 'phoneFrom': '+7 999 123-45-67', 'text': 'Your code: 12345', 'service': 'tg'
+        })
+
+        async def get_rent_status(rent_id, background=False):
+            return {'status': 'success', 'quantity': '1', 'values': {'0': {
+                'phoneFrom': '79991234567', 'text': 'Your code:  12345 ', 'service': 'tg',
+                'date': '2026-10-18 12:00:00'
+            }}}
+        api.get_rent_status = get_rent_status
+        await api._poll_rent(RentDatabase.get_rent_order_by_id(rent_id))
+        await api.close()
+
+    asyncio.run(scenario())
+    assert Outbox.select().count() == 1
@@ -0,0 +1,31 @@
+import asyncio
+
+import structlog
+
+from bot.api.sms_client.sms_activate import SMSActivateAPI
+
+
+def test_cancelled_rate_limit_wait_releases_breaker_probe(make_config):
+    async def scenario():
+        api = SMSActivateAPI(
+            'sms-activate-token', structlog.get_logger(), None,
+            make_config(price_index_interval=0)
+        )
+        api._running = False
+
+        # Breaker ждёт пробный запрос, лимит запросов исчерпан
+        api.breaker.state = 'open'
+        api.breaker.opened_at = 0
+        api.requests.rate_limiter.tokens = 0
+        api.requests.rate_limiter.rate = 0.01
+
+        request = asyncio.create_task(api._send('GET', {'action': 'getNumber'}))
+        await asyncio.sleep(0.05)
+        request.cancel()
+        await asyncio.gather(request, return_exceptions=True)
+
+        allowed = api.breaker.allow()
+        await api.close()
+        return allowed
+
+    assert asyncio.run(scenario())
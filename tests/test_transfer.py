@@ -0,0 +1,37 @@
+import asyncio
+from types import SimpleNamespace
+
+from bot.database import User
+from bot.handlers.profile import complete_transfer
+
+
+def test_failed_transfer_does_not_notify_recipient(database):
+    User.create(id=1, username='sender', balance=100, balance_minor=10000)
+    sent, answers = [], []
+
+    async def answer(text, **kwargs):
+        answers.append(text)
+
+    async def get_data():
+        # Получатель удалён после выбора - transfer_balance вернёт False
+        return {'to': 2, 'to_username': 'recipient'}
+
+    message = SimpleNamespace(
+        text='50',
+        from_user=SimpleNamespace(id=1, username='sender'),
+        answer=answer,
+        bot=SimpleNamespace(
+            textgen=SimpleNamespace(
+                get=lambda *keys, **kwargs: keys[1],
+                generate_inline_markup=lambda *args, **kwargs: None,
+                generate_keyboard_markup=lambda *args, **kwargs: None
+            ),
+            send_queue=SimpleNamespace(send_message=lambda *args, **kwargs: sent.append(args))
+        )
+    )
+    state = SimpleNamespace(get_data=get_data)
+
+    asyncio.run(complete_transfer(message, state))
+    assert sent == []
+    assert answers == ['insufficient_funds']
+    assert User.get_by_id(1).balance_minor == 10000
@@ -0,0 +1,26 @@
+import asyncio
+
+import structlog
+
+from bot.database import User, UserDatabase, run_db
+from bot.database.cache import user_cache
+from bot.utils.username_flusher import UsernameFlusher
+
+
+def test_pending_username_is_written_on_shutdown(database, make_config):
+    flusher = UsernameFlusher(make_config(user_cache_flush_interval=3600), structlog.get_logger())
+
+    async def scenario():
+        await run_db(lambda: UserDatabase(42, 'old').new_user())
+        flusher.start()
+        assert UserDatabase.touch_cached(42, 'new')
+
+        # Остановка как в main.py: цикл отменён, остаток записан
+        await flusher.close()
+        await run_db(UserDatabase.flush_usernames)
+        return await run_db(lambda: User.get_by_id(42).username)
+
+    try:
+        assert asyncio.run(scenario()) == 'new'
+    finally:
+        user_cache.invalidate(42)
@@ -0,0 +1,25 @@
+import asyncio
+
+import pytest
+import structlog
+
+from aiohttp.test_utils import make_mocked_request
+from pydantic import ValidationError
+
+from bot.api.sms_client.webhook import SmsActivateWebhook
+
+
+@pytest.mark.parametrize('secret', [None, '', '  '])
+def test_webhook_requires_secret(make_config, secret):
+    with pytest.raises(ValidationError):
+        make_config(sms_webhook_enabled=True, sms_webhook_secret=secret)
+
+
+@pytest.mark.parametrize('query', ['', '?secret=', '?secret=wrong'])
+def test_webhook_rejects_wrong_secret(make_config, query):
+    webhook = SmsActivateWebhook(
+        None, make_config(sms_webhook_enabled=True, sms_webhook_secret='s3cret'), structlog.get_logger()
+    )
+    request = make_mocked_request('POST', f'/sms-activate/webhook{query}')
+
+    assert asyncio.run(webhook.handle(request)).status == 403
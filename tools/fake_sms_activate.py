@@ -0,0 +1,254 @@
+'''
+Локальная замена api.sms-activate.guru для нагрузочного тестирования.
+
+Реализует действия handler_api.php, которые использует SMSActivateAPI:
+getBalance, getServicesList, getTopCountriesByService, getNumber, getStatus,
+setStatus, getPrices, getActiveActivations, getRentNumber, getRentStatus,
+setRentStatus, getRentServicesAndCountries.
+
+Задержка ответа, доля ошибок и время прихода SMS настраиваются.
+
+Запуск:
+    python3 tools/fake_sms_activate.py --port 8090 --latency-ms 80 --error-rate 0.01
+    SMS_ACTIVATE_BASE_URL=http://127.0.0.1:8090/ python3 main.py
+'''
+
+import argparse, asyncio, itertools, random, time
+from datetime import datetime, timedelta
+from typing import Dict, List, Union
+
+from aiohttp import web
+
+
+SERVICES = [
+    {"code": "tg", "name": "Telegram"},
+    {"code": "wa", "name": "WhatsApp"},
+    {"code": "vk", "name": "ВКонтакте"},
+    {"code": "go", "name": "Google"},
+    {"code": "ig", "name": "Instagram"},
+]
+COUNTRIES = [0, 1, 2, 6, 12, 16, 22, 36, 43, 187]
+
+
+class FakeSmsActivate:
+    def __init__(
+            self,
+            latency_ms: float = 50,
+            error_rate: float = 0.0,
+            sms_delay: List[float] = (5, 30),
+            rent_sms_interval: float = 60,
+            seed: Union[int, None] = None
+        ) -> None:
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.sms_delay = sms_delay
+        self.rent_sms_interval = rent_sms_interval
+        self.random = random.Random(seed)
+
+        self._ids = itertools.count(100000)
+        self.activations: Dict[str, Dict] = {}
+        self.rents: Dict[str, Dict] = {}
+        self.requests: Dict[str, int] = {}
+        self.errors = 0
+
+        self.app = web.Application()
+        self.app.router.add_route('*', '/stubs/handler_api.php', self.handle)
+        self._runner: Union[web.AppRunner, None] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8090) -> int:
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        params = dict(request.query)
+        action = params.get('action', '')
+        self.requests[action] = self.requests.get(action, 0) + 1
+
+        if self.latency_ms:
+            await asyncio.sleep(self.random.expovariate(1000 / self.latency_ms))
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.errors += 1
+            return web.Response(status=502, text='Bad Gateway')
+
+        handler = getattr(self, f'action_{action}', None)
+        if handler is None:
+            return web.Response(text='BAD_ACTION')
+
+        result = handler(params)
+        if isinstance(result, str):
+            return web.Response(text=result)
+        return web.json_response(result)
+
+    # --- активации ---
+
+    def _code_ready(self, activation: Dict) -> bool:
+        return activation['status'] == 'wait' and time.monotonic() >= activation['code_at']
+
+    def action_getBalance(self, params: Dict) -> str:
+        return 'ACCESS_BALANCE:100000.00'
+
+    def action_getServicesList(self, params: Dict) -> Dict:
+        return {"status": "success", "services": SERVICES}
+
+    def action_getTopCountriesByService(self, params: Dict) -> Dict:
+        return {
+            str(index): {
+                "country": country,
+                "count": 1000,
+                "price": 10 + country % 7,
+                "retail_price": 20 + country % 7
+            }
+            for index, country in enumerate(COUNTRIES)
+        }
+
+    def action_getPrices(self, params: Dict) -> Dict:
+        countries = [int(params['country'])] if params.get('country') else COUNTRIES
+        services = [params['service']] if params.get('service') else [service['code'] for service in SERVICES]
+        return {
+            str(country): {
+                service: {"cost": 10 + country % 7, "count": 1000}
+                for service in services
+            }
+            for country in countries
+        }
+
+    def action_getNumber(self, params: Dict) -> str:
+        activation_id = str(next(self._ids))
+        phone = f"7900{activation_id:0>7}"
+        self.activations[activation_id] = {
+            'service': params.get('service', ''),
+            'country': int(params.get('country', 0)),
+            'phone': phone,
+            'status': 'wait',
+            'created_at': time.monotonic(),
+            'code_at': time.monotonic() + self.random.uniform(*self.sms_delay),
+            'code': str(self.random.randint(10000, 99999))
+        }
+        return f'ACCESS_NUMBER:{activation_id}:{phone}'
+
+    def action_getStatus(self, params: Dict) -> str:
+        activation = self.activations.get(params.get('id', ''))
+        if activation is None:
+            return 'NO_ACTIVATION'
+        if activation['status'] == 'cancel':
+            return 'STATUS_CANCEL'
+        if activation['status'] == 'done' or self._code_ready(activation):
+            return f"STATUS_OK:{activation['code']}"
+        return 'STATUS_WAIT_CODE'
+
+    def action_setStatus(self, params: Dict) -> str:
+        activation = self.activations.get(params.get('id', ''))
+        if activation is None:
+            return 'NO_ACTIVATION'
+
+        status = int(params.get('status', 0))
+        if status in (3, 6):
+            activation['code_at'] = time.monotonic() + self.random.uniform(*self.sms_delay)
+            return 'ACCESS_RETRY_GET'
+        if status == 8:
+            activation['status'] = 'cancel'
+            return 'ACCESS_CANCEL'
+        activation['status'] = 'done'
+        return 'ACCESS_ACTIVATION'
+
+    def action_getActiveActivations(self, params: Dict) -> Union[Dict, str]:
+        active = [
+            {
+                "activationId": activation_id,
+                "serviceCode": activation['service'],
+                "phoneNumber": activation['phone'],
+                "activationStatus": "2" if self._code_ready(activation) else "1",
+                "smsCode": [activation['code']] if self._code_ready(activation) else None,
+                "countryCode": str(activation['country'])
+            }
+            for activation_id, activation in self.activations.items()
+            if activation['status'] == 'wait'
+        ]
+        if not active:
+            return 'NO_ACTIVATIONS'
+        return {"status": "success", "activeActivations": active}
+
+    # --- аренда ---
+
+    def action_getRentServicesAndCountries(self, params: Dict) -> Dict:
+        return {
+            "countries": {str(country): country for country in COUNTRIES},
+            "operators": {"0": "any"},
+            "services": {
+                service['code']: {"cost": 5.0, "quant": 100}
+                for service in SERVICES
+            }
+        }
+
+    def action_getRentNumber(self, params: Dict) -> Dict:
+        rent_id = str(next(self._ids))
+        rent_time = int(params.get('rent_time', 4))
+        end_date = datetime.now() + timedelta(hours=rent_time)
+        self.rents[rent_id] = {
+            'service': params.get('service', ''),
+            'number': f"7901{rent_id:0>7}",
+            'created_at': time.monotonic(),
+            'end_date': end_date
+        }
+        return {
+            "status": "success",
+            "phone": {
+                "id": int(rent_id),
+                "endDate": end_date.strftime('%Y-%m-%d %H:%M:%S'),
+                "number": self.rents[rent_id]['number']
+            }
+        }
+
+    def action_getRentStatus(self, params: Dict) -> Dict:
+        rent = self.rents.get(params.get('id', ''))
+        if rent is None:
+            return {"status": "error", "message": "NO_ID_RENT"}
+
+        quantity = int((time.monotonic() - rent['created_at']) // self.rent_sms_interval)
+        values = {
+            str(index): {
+                "phoneFrom": rent['service'],
+                "text": f"Your code: {10000 + index}",
+                "service": rent['service'],
+                "date": (datetime.now() - timedelta(seconds=(quantity - index) * self.rent_sms_interval)).strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for index in range(quantity)
+        }
+        return {"status": "success", "quantity": str(quantity), "values": values}
+
+    def action_setRentStatus(self, params: Dict) -> Dict:
+        if self.rents.pop(params.get('id', ''), None) is None:
+            return {"status": "error", "message": "NO_ID_RENT"}
+        return {"status": "success"}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Fake SMS-Activate API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency-ms', type=float, default=50, help='средняя задержка ответа')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 502')
+    parser.add_argument('--sms-delay', type=float, nargs=2, default=[5, 30], help='SMS приходит через min..max секунд')
+    parser.add_argument('--rent-sms-interval', type=float, default=60)
+    args = parser.parse_args()
+
+    fake = FakeSmsActivate(args.latency_ms, args.error_rate, args.sms_delay, args.rent_sms_interval)
+    port = await fake.start(args.host, args.port)
+    print(f'Fake SMS-Activate on http://{args.host}:{port}/')
+
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fake.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,205 @@
+'''
+Нагрузочный прогон бота против локальной замены SMS-Activate (tools/fake_sms_activate.py).
+
+Покупки идут через настоящий handler create_new_sms_invoice, коды забирает
+настоящий SMSActivateAPI._backend_puller. На выходе - пропускная способность
+покупок, время от появления кода у провайдера до отправки пользователю
+(time-to-code) и число запросов к API по действиям.
+
+Запуск:
+    python3 tools/loadtest.py --orders 100 1000 10000 --sms-delay 5 30
+'''
+
+import argparse, asyncio, logging, os, sys, tempfile, time, types
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import structlog
+
+from fake_sms_activate import FakeSmsActivate
+from config.generator import TextGenerator
+from config.models import Config
+from bot.api import SMSActivateAPI
+from bot.database import db, GlobalDatabase, User, UserDatabase, run_db
+from bot.database.migrations import run_migrations
+from bot.handlers.buy_number import create_new_sms_invoice
+from bot.utils.send_queue import SendQueue
+from bot.utils.outbox import OutboxDrainer
+from bot.utils.loop_lag import LoopLagMonitor
+
+
+USERS = 100
+
+
+class HarnessBot:
+    '''Минимальная замена aiogram Bot: сообщения не уходят в Telegram, а считаются'''
+
+    def __init__(self, config: Config, logger) -> None:
+        self.config = config
+        self.logger = logger
+        self.textgen = TextGenerator(config.messages_path)
+        self.sent = 0
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> None:
+        self.sent += 1
+
+
+class HarnessCall:
+    '''Минимальная замена CallbackQuery для handler'ов покупки'''
+
+    def __init__(self, bot: HarnessBot, user_id: int, data: str) -> None:
+        self.bot = bot
+        self.data = data
+        self.from_user = types.SimpleNamespace(id=user_id)
+        self.message = types.SimpleNamespace(edit_text=self._noop)
+        self.answered = None
+
+    async def _noop(self, *args, **kwargs) -> None:
+        pass
+
+    async def answer(self, text: str = None, **kwargs) -> None:
+        self.answered = text
+
+
+def build_config(args: argparse.Namespace, base_url: str) -> Config:
+    return Config(
+        version='loadtest',
+        bot_token='0:loadtest',
+        admin_id='0',
+        service_fee=0.05,
+        service_name='loadtest',
+        referal_fee=0,
+        messages_path='config/messages/default.yaml',
+        messages_parse_mode='HTML',
+        sms_activate_api_token='loadtest-token',
+        crypto_bot_api_token='loadtest-token',
+        cryptobot_usdt_rub_rate=90,
+        tg_stars_max=0,
+        tg_stars_star_rub_rate='100:215',
+        success_payment_reaction_id=None,
+        support_username='loadtest',
+        support_redirect_channel='loadtest',
+        payment_timeout_minutes=10,
+        sms_activate_base_url=base_url,
+        sms_activate_rps=args.rps,
+        sms_activate_background_rps=args.background_rps,
+        sms_poll_concurrency=args.poll_concurrency,
+        price_index_interval=0
+    )
+
+
+def percentile(values: List[float], percent: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+async def run_scenario(orders: int, args: argparse.Namespace, logger) -> Dict:
+    fake = FakeSmsActivate(args.latency_ms, args.error_rate, args.sms_delay, seed=orders)
+    port = await fake.start(port=0)
+
+    db.init(os.path.join(tempfile.mkdtemp(), 'loadtest.sqlite'))
+    run_migrations(GlobalDatabase.create_tables())
+    for user_id in range(1, USERS + 1):
+        User.create(id=user_id, username=f'user{user_id}')
+        UserDatabase.transfer_balance(0, user_id, 10 ** 9, kind='deposit')
+
+    config = build_config(args, f'http://127.0.0.1:{port}/')
+    GlobalDatabase.configure(config)
+    bot = HarnessBot(config, logger)
+    bot.send_queue = SendQueue(bot, config, logger)
+    bot.send_queue.start()
+    bot.outbox = OutboxDrainer(bot, config, logger, 'loadtest')
+    bot.outbox.start()
+    loop_lag = LoopLagMonitor(config, logger)
+    loop_lag.start()
+    sms_activate = SMSActivateAPI(config.sms_activate_api_token, logger, bot, config)
+    bot.sms_activate = sms_activate
+
+    # Фиксируем момент доставки кода по каждой активации
+    delivered: Dict[str, float] = {}
+    process_sms_received = sms_activate._process_sms_received
+
+    async def record_delivery(order, code):
+        await process_sms_received(order, code)
+        delivered.setdefault(str(order.order_id), time.monotonic())
+
+    sms_activate._process_sms_received = record_delivery
+
+    # Покупки через handler
+    semaphore = asyncio.Semaphore(args.purchase_concurrency)
+    failed = 0
+
+    async def purchase(index: int) -> None:
+        nonlocal failed
+        call = HarnessCall(bot, index % USERS + 1, 'create-sms_Telegram_tg_0_10.5')
+        async with semaphore:
+            await create_new_sms_invoice(call)
+        if call.answered:
+            failed += 1
+
+    purchase_started = time.monotonic()
+    await asyncio.gather(*(purchase(index) for index in range(orders)))
+    purchase_duration = time.monotonic() - purchase_started
+
+    # Ждём, пока puller доставит все коды
+    deadline = time.monotonic() + args.sms_delay[1] + args.timeout
+    while len(delivered) < len(fake.activations) and time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+
+    time_to_code = [
+        delivered[activation_id] - activation['code_at']
+        for activation_id, activation in fake.activations.items()
+        if activation_id in delivered
+    ]
+
+    await sms_activate.close()
+    await loop_lag.close()
+    await bot.outbox.close()
+    await bot.send_queue.close()
+    await fake.close()
+    # Следующий сценарий откроет новый файл БД - закрываем соединение потока БД
+    await run_db(db.close)
+
+    return {
+        'orders': orders,
+        'purchased': len(fake.activations),
+        'failed': failed,
+        'purchase_rps': round(orders / purchase_duration, 1),
+        'delivered': len(delivered),
+        'ttc_p50': round(percentile(time_to_code, 50), 2),
+        'ttc_p95': round(percentile(time_to_code, 95), 2),
+        'ttc_max': round(max(time_to_code, default=0), 2),
+        'max_cycle': sms_activate.poll_stats['max_cycle_duration'],
+        'loop_lag': loop_lag.stats(),
+        'api_errors': fake.errors,
+        'requests': dict(sorted(fake.requests.items()))
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='SMS bot load test against fake SMS-Activate')
+    parser.add_argument('--orders', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--sms-delay', type=float, nargs=2, default=[5, 30])
+    parser.add_argument('--purchase-concurrency', type=int, default=50)
+    parser.add_argument('--poll-concurrency', type=int, default=20)
+    parser.add_argument('--rps', type=float, default=0, help='лимит пользовательских запросов, 0 - без лимита')
+    parser.add_argument('--background-rps', type=float, default=0, help='лимит запросов puller, 0 - без лимита')
+    parser.add_argument('--timeout', type=float, default=60, help='сколько ждать доставки после последней SMS')
+    args = parser.parse_args()
+
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    logger = structlog.get_logger()
+
+    for orders in args.orders:
+        result = await run_scenario(orders, args, logger)
+        print(' '.join(f'{key}={value}' for key, value in result.items()), flush=True)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
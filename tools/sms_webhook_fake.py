@@ -0,0 +1,62 @@
+'''
+Локальная имитация webhook'ов SMS-Activate: отправляет POST с входящей SMS
+на приёмник бота (SMS_WEBHOOK_ENABLED=true).
+
+Примеры:
+    python3 tools/sms_webhook_fake.py activation 123456 --code 4242
+    python3 tools/sms_webhook_fake.py rent 987654 --text "Ваш код 4242" --phone-from Telegram
+'''
+
+import argparse, asyncio
+from datetime import datetime
+
+from httpx import AsyncClient
+
+
+def build_payload(args: argparse.Namespace) -> dict:
+    received_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    if args.kind == 'activation':
+        return {
+            "activationId": args.id,
+            "service": args.service,
+            "text": args.text or f"Your code: {args.code}",
+            "code": args.code,
+            "country": args.country,
+            "receivedAt": received_at
+        }
+    return {
+        "rentId": args.id,
+        "service": args.service,
+        "phoneFrom": args.phone_from,
+        "text": args.text or f"Your code: {args.code}",
+        "receivedAt": received_at
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Fake SMS-Activate webhook sender')
+    parser.add_argument('kind', choices=['activation', 'rent'])
+    parser.add_argument('id', type=int, help='activationId или rentId')
+    parser.add_argument('--code', default='12345')
+    parser.add_argument('--text', default=None)
+    parser.add_argument('--service', default='tg')
+    parser.add_argument('--country', type=int, default=0)
+    parser.add_argument('--phone-from', default='Telegram')
+    parser.add_argument('--url', default='http://127.0.0.1:8080/sms-activate/webhook')
+    parser.add_argument('--secret', default=None)
+    parser.add_argument('--repeat', type=int, default=1, help='сколько раз отправить (проверка идемпотентности)')
+    args = parser.parse_args()
+
+    async with AsyncClient() as client:
+        for _ in range(args.repeat):
+            response = await client.post(
+                args.url,
+                json=build_payload(args),
+                params={'secret': args.secret} if args.secret else None
+            )
+            print(response.status_code, response.text)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())